@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# The collector, the synthetic data generator and the engine's instrumentation live in data/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+from main import MetamaskCardTransactionCollector
+from synthetic import generate_receipt_logs, generate_spending_data, save_synthetic_spending
+
+from user import ChunkedSpendingAggregates, MetaSenseReputationEngine, iter_spending_chunks, max_rank_error
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+AS_OF = datetime(2025, 7, 2)
+REGRESSION_THRESHOLD = 1.25
+SKETCH_K = 200
+
+def measure(fn, memory=True):
+    """Run fn once untraced for wall time, then once under tracemalloc for peak memory
+
+    Returns (result, seconds, peak_mb); peak_mb is None when memory is off.
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+
+    return result, seconds, peak_mb
+
+def git_commit():
+    """Short hash of HEAD (with -dirty for local changes), or None outside git"""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True, cwd=repo).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True, cwd=repo).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_size(n_transactions, seed=0, decode_sample=100_000, memory=True, sketch_k=SKETCH_K):
+    """Benchmark every stage on one synthetic dataset
+
+    Returns the wallet count and {stage: {'seconds', 'peak_mb'}}.
+    """
+    stages = {}
+    spending = generate_spending_data(n_transactions, seed=seed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = save_synthetic_spending(spending, os.path.join(workdir, 'spending.csv'))
+        prefix = os.path.join(workdir, 'reputation')
+        engine, stages['load'] = _timed(lambda: MetaSenseReputationEngine(path, result_cache_size=0), memory)
+        profiles, stages['analyze_all_users'] = _timed(lambda: engine.analyze_all_users(as_of=AS_OF), memory)
+        _, stages['generate_reputation_report'] = _timed(lambda: engine.generate_reputation_report(profiles), memory)
+        _, stages['export_reputation_data'] = _timed(lambda: engine.export_reputation_data(profiles, prefix), memory)
+        _, stages['analyze_file_chunked'] = _timed(
+            lambda: engine.analyze_file_chunked(path, chunk_rows=max(n_transactions // 10, 1), as_of=AS_OF), memory)
+        
+        engine.quantile_sketch_k = sketch_k
+        _, stages['analyze_file_chunked_sketch'] = _timed(
+            lambda: engine.analyze_file_chunked(path, chunk_rows=max(n_transactions // 10, 1), as_of=AS_OF), memory)
+        stages['analyze_file_chunked_sketch'].update(
+            sketch_rank_error(path, spending, sketch_k, max(n_transactions // 10, 1)))
+
+    # Log decoding on (a sample of) the same transactions
+    receipts = list(generate_receipt_logs(spending.head(decode_sample), seed=seed).values())
+    collector = MetamaskCardTransactionCollector("benchmark", auto_discover_settlements=False,
+                                                 receipt_cache_path=None)
+    _, stages['decode_transfer_events'] = _timed(
+        lambda: [collector.decode_all_transfer_events(logs) for logs in receipts], memory)
+    stages['decode_transfer_events']['receipts'] = len(receipts)
+    _, stages['decode_transfer_batch'] = _timed(
+        lambda: collector.decode_transfer_batch(receipts, collector.known_settlements), memory)
+    stages['decode_transfer_batch']['logs'] = sum(len(logs) for logs in receipts)
+
+    return int(spending['user_wallet'].nunique()), stages
+
+def sketch_rank_error(path, spending, k, chunk_rows):
+    """Largest rank error of the per-wallet sketched medians and 80th percentiles against exact ones"""
+    aggregates = ChunkedSpendingAggregates(AS_OF, k)
+    for chunk in iter_spending_chunks(path, chunk_rows):
+        aggregates.add_chunk(chunk)
+        
+    amounts = spending.groupby('user_wallet', sort=False)['amount']
+    errors = [max_rank_error(sketch, amounts.get_group(aggregates.wallets[code]).to_numpy())
+              for code, sketch in aggregates.sketches.items()]
+    return {'k': k, 'sketched_wallets': len(errors), 'max_rank_error': round(max(errors, default=0.0), 6)}
+
+def _timed(fn, memory):
+    result, seconds, peak_mb = measure(fn, memory)
+    return result, {'seconds': round(seconds, 4), 'peak_mb': None if peak_mb is None else round(peak_mb, 1)}
+
+def load_results(path):
+    """All stored benchmark records, oldest first"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare_with_previous(record, history):
+    """Print stage timings next to the latest earlier run of the same size, flagging slowdowns"""
+    previous = next((r for r in reversed(history)
+                     if r['transactions'] == record['transactions'] and r['seed'] == record['seed']), None)
+
+    print(f"\n📊 {record['transactions']:,} transactions / {record['wallets']:,} wallets"
+          + (f" (vs {previous['commit']} at {previous['recorded_at'][:19]})" if previous else ""))
+    for stage, result in record['stages'].items():
+        line = f"  {stage:<28} {result['seconds']:>9.3f}s"
+        if result['peak_mb'] is not None:
+            line += f"  peak {result['peak_mb']:>9.1f} MB"
+        before = previous['stages'].get(stage) if previous else None
+        if before and before['seconds'] > 0:
+            ratio = result['seconds'] / before['seconds']
+            line += f"  {ratio:5.2f}x"
+            if ratio > REGRESSION_THRESHOLD:
+                line += "  ⚠️ regression"
+        if 'max_rank_error' in result:
+            line += (f"  max rank error {result['max_rank_error']:.2%}"
+                     f" over {result['sketched_wallets']:,} sketched wallets (k={result['k']})")
+        print(line)
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed=0, results_path="benchmark_results.jsonl",
+                   decode_sample=100_000, memory=True, sketch_k=SKETCH_K):
+    """Benchmark each size, append the records to results_path and report changes"""
+    history = load_results(results_path)
+    commit = git_commit()
+
+    records = []
+    for n_transactions in sizes:
+        print(f"⏱️  Benchmarking {n_transactions:,} synthetic transactions...")
+        wallets, stages = run_size(n_transactions, seed, decode_sample, memory, sketch_k)
+        record = {
+            'recorded_at': datetime.now().isoformat(),
+            'commit': commit,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'transactions': n_transactions,
+            'seed': seed,
+            'wallets': wallets,
+            'stages': stages
+        }
+        compare_with_previous(record, history)
+        records.append(record)
+
+        with open(results_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    print(f"\n📄 Results appended to: {results_path}")
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the reputation engine and log decoding on synthetic data")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated transaction counts")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--results', default="benchmark_results.jsonl")
+    parser.add_argument('--decode-sample', type=int, default=100_000,
+                        help="receipts to decode per size")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc peak-memory pass")
+    parser.add_argument('--sketch-k', type=int, default=SKETCH_K,
+                        help="quantile sketch size for the sketched chunked analysis")
+    args = parser.parse_args()
+
+    run_benchmarks([int(size) for size in args.sizes.split(',')], args.seed, args.results,
+                   args.decode_sample, not args.no_memory, args.sketch_k)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The collector and the instrumentation user.py shares with it live in data/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
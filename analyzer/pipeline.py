@@ -0,0 +1,92 @@
+import csv
+import logging
+import os
+import sys
+from datetime import datetime
+
+# The collector and the instrumentation shared with the engine live in data/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+from main import MetamaskCardTransactionCollector
+from instrumentation import METRICS
+
+from user import (MetaSenseReputationEngine, SPENDING_COLUMNS, load_aggregate_state, resolve_as_of,
+                  save_aggregate_state)
+
+logger = logging.getLogger(__name__)
+
+def csv_sink(batches, filename):
+    """Pass batches through unchanged while appending their records to a CSV"""
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SPENDING_COLUMNS)
+        writer.writeheader()
+        for batch in batches:
+            writer.writerows(batch)
+            yield batch
+
+def run_pipeline(collector: MetamaskCardTransactionCollector, engine: MetaSenseReputationEngine,
+                 state_path: str = "metasense_reputation_state.pkl", use_logs: bool = True,
+                 incremental: bool = True, export_csv: bool = False, max_in_flight: int = 8,
+                 as_of=None):
+    """Collect card spending and score it in one process
+
+    Records flow from the collector straight into the engine's per-wallet
+    aggregates; no spending CSV is written or re-read unless export_csv is
+    set. The aggregate state and the collector's listing high-water mark
+    are saved together at the end, so the next run only handles new blocks.
+    Before saving, the state is pruned to the last 30 days of timestamps and
+    the hashes of blocks this run could still replay, so it grows with
+    recent activity rather than the full history. Wallets are scored as of
+    as_of (default now); a non-incremental run rebuilds the state from
+    scratch.
+    """
+    as_of = resolve_as_of(as_of)
+    state = load_aggregate_state(state_path) if incremental else {}
+    start_block = collector.load_listing_state() + 1 if incremental else 0
+    logger.info(f"🔗 Streaming card spending from block {start_block:,} into {len(state):,} known wallets")
+
+    if use_logs:
+        batches = collector.iter_spending_batches_from_logs(start_block)
+    else:
+        batches = collector.iter_spending_batches(start_block, max_in_flight)
+
+    if export_csv:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        batches = csv_sink(batches, f"metamask_card_streamed_spending_{timestamp}.csv")
+
+    engine.consume_spending_batches(batches, state)
+
+    # Blocks before start_block are never listed again; this run's blocks may be if the listing save below fails
+    for aggregate in state.values():
+        aggregate.prune(as_of, start_block)
+        
+    # Aggregates first: replaying blocks is harmless (seen tx hashes are skipped), losing them is not
+    save_aggregate_state(state, state_path)
+    collector.save_listing_state(collector.listed_through_block)
+
+    return engine.analyze_from_state(state, as_of)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    logger.info("🚀 MetaSense Streaming Pipeline")
+    logger.info("="*60)
+
+    API_KEY = os.environ.get("ETHERSCAN_API_KEY", "YourAPIKey")
+
+    collector = MetamaskCardTransactionCollector(API_KEY, auto_discover_settlements=False)
+    engine = MetaSenseReputationEngine()
+
+    profiles = run_pipeline(collector, engine)
+
+    engine.generate_reputation_report(profiles)
+    
+    # After the first run only wallets whose on-chain values changed are exported
+    contract_index = "metasense_reputation_contract_index.csv"
+    files = engine.export_reputation_data(
+        profiles, previous_contract_data=contract_index if os.path.exists(contract_index) else None)
+
+    logger.info(f"\n✅ Streaming pipeline complete!")
+    logger.info(f"📊 {len(profiles)} user profiles generated")
+    logger.info(f"📄 Data exported to: {files[0]} and {files[1]}")
+    logger.info(f"📈 Metrics written to {METRICS.write_prometheus('metasense_pipeline_metrics.prom')} "
+                f"and {METRICS.write_json('metasense_pipeline_metrics.json')}")
@@ -0,0 +1,110 @@
+import csv
+import random
+
+import pytest
+
+from main import SPENDING_COLUMNS, MetamaskCardTransactionCollector, SpendingCheckpoint
+
+def _mine(chain, rng, blocks):
+    """Append `blocks` new blocks of 1-3 transactions to chain (oldest first)"""
+    block = chain[-1]['block_number'] if chain else 0
+    for _ in range(blocks):
+        block += rng.randint(1, 3)
+        for _ in range(rng.randint(1, 3)):
+            chain.append({'hash': f"0x{len(chain):064x}", 'block_number': block})
+
+def _records(tx):
+    return [dict(dict.fromkeys(SPENDING_COLUMNS, ''), transaction_hash=tx['hash'], block_number=tx['block_number'])]
+
+def _run(prefix, chain, crash_at, rng):
+    """One collector run over the listed chain, as collect_all_card_transactions drives the checkpoint
+
+    With crash_at set (a fraction of the pending transactions) the run
+    stops there without flushing, sometimes after appending its buffer to
+    the log but before the cursor write, like a crash inside flush.
+    """
+    checkpoint = SpendingCheckpoint(prefix, chunk_size=7, flush_every=5)
+    resumed = checkpoint.resumable
+    if not resumed:
+        checkpoint.reset()
+    contract_txs = sorted(chain, key=lambda tx: tx['block_number'], reverse=True)
+    newest_block = contract_txs[0]['block_number'] if contract_txs else 0
+    if resumed:
+        contract_txs = checkpoint.pending_transactions(contract_txs)
+
+    crash_after = int(crash_at * len(contract_txs)) if crash_at is not None else None
+    for i, tx in enumerate(contract_txs):
+        if i == crash_after:
+            if checkpoint.buffer and rng.random() < 0.5:
+                with open(checkpoint.log_path, 'a', newline='') as f:
+                    csv.DictWriter(f, fieldnames=SPENDING_COLUMNS).writerows(checkpoint.buffer)
+            return
+        checkpoint.add(tx, _records(tx), newest_block)
+    checkpoint.mark_complete()
+
+@pytest.mark.parametrize('seed', range(60))
+def test_checkpoint_resumes_every_transaction_once(tmp_path, seed):
+    rng = random.Random(seed)
+    prefix = str(tmp_path / 'checkpoint')
+    chain = []
+    _mine(chain, rng, rng.randint(20, 80))
+
+    for _ in range(rng.randint(1, 5)):
+        _run(prefix, chain, rng.random(), rng)
+        # New blocks can be mined before the next run lists the contract again
+        if rng.random() < 0.7:
+            _mine(chain, rng, rng.randint(1, 20))
+    _run(prefix, chain, None, rng)
+
+    with open(f"{prefix}.csv", newline='') as f:
+        logged = [row['transaction_hash'] for row in csv.DictReader(f)]
+    assert sorted(logged) == sorted(tx['hash'] for tx in chain)
+
+def _offline_collector(**attributes):
+    """Collector without network, cache or state files; attributes replace its fetchers"""
+    collector = MetamaskCardTransactionCollector('key', auto_discover_settlements=False, receipt_cache_path=None,
+                                                 listing_state_path=None, token_registry_path=None)
+    for name, value in attributes.items():
+        setattr(collector, name, value)
+    return collector
+
+@pytest.mark.parametrize('max_in_flight', [1, 4])
+def test_block_mode_never_needs_more_requests_than_batching(max_in_flight):
+    # 20 blocks of 3 transactions and 140 of 1, then a few large blocks
+    sizes = [3] * 20 + [1] * 140 + [120, 80, 60]
+    contract_txs = [{'hash': f"0x{i:064x}", 'block_number': block}
+                    for i, block in enumerate(block for block, size in enumerate(sizes) for _ in range(size))]
+    by_block = {}
+    for tx in contract_txs:
+        by_block.setdefault(tx['block_number'], []).append(tx['hash'])
+    calls = []
+
+    def fetch_block_receipts(block):
+        calls.append('block')
+        return {tx_hash: [] for tx_hash in by_block[block]}
+
+    def fetch_receipts_batch(tx_hashes):
+        calls.append('batch')
+        assert len(tx_hashes) <= 50
+        return {tx_hash: [] for tx_hash in tx_hashes}
+
+    collector = _offline_collector(receipts_by_block=True, receipt_batch_size=50,
+                                   fetch_block_receipts=fetch_block_receipts,
+                                   fetch_receipts_batch=fetch_receipts_batch)
+    results = list(collector.iter_transfers_by_block(contract_txs, max_in_flight))
+
+    assert [tx for tx, _ in results] == contract_txs
+    assert len(calls) <= -(-len(contract_txs) // 50)
+    assert 'block' in calls
+
+def test_unknown_chain_head_is_never_saved_as_listed():
+    def fetch_txlist_range(low, high):
+        return [{'hash': f"0x{block:064x}", 'block_number': block} for block in range(100, 110) if low <= block <= high]
+
+    collector = _offline_collector(get_latest_block_number=lambda: None, _fetch_txlist_range=fetch_txlist_range)
+    assert len(collector.get_all_contract_transactions(0)) == 10
+    assert collector.listed_through_block == 109
+
+    collector.get_latest_block_number = lambda: 500
+    collector.get_all_contract_transactions(0)
+    assert collector.listed_through_block == 500
@@ -0,0 +1,128 @@
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from user import (TRUST_LEVELS, USER_CLASSES, ChunkedSpendingAggregates, MetaSenseReputationEngine, _round_1,
+                  iter_spending_chunks)
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "metamask_card_complete_spending_20250702_055722.csv")
+AS_OF = datetime(2025, 7, 3)
+
+# Grouped and per-wallet Series reductions sum in a different order
+METRIC_RTOL = 1e-9
+
+@pytest.fixture(scope="module")
+def sample_engine():
+    return MetaSenseReputationEngine(SAMPLE_CSV, result_cache_size=0)
+
+def test_grouped_analysis_matches_reference(sample_engine):
+    reference = sample_engine.analyze_all_users_reference(as_of=AS_OF)
+    profiles = sample_engine.analyze_all_users(as_of=AS_OF)
+
+    assert list(profiles) == list(reference)
+    for wallet, expected in reference.items():
+        profile = profiles[wallet]
+        assert profile.verification_timestamp == expected.verification_timestamp
+        assert profile.reputation_scores == expected.reputation_scores
+        assert profile.trust_level == expected.trust_level
+        assert profile.user_class == expected.user_class
+        assert profile.classification_reasoning == expected.classification_reasoning
+
+        assert profile.behavioral_metrics.keys() == expected.behavioral_metrics.keys()
+        for name, value in expected.behavioral_metrics.items():
+            actual = profile.behavioral_metrics[name]
+            if isinstance(value, float):
+                assert actual == pytest.approx(value, rel=METRIC_RTOL, nan_ok=True), (wallet, name)
+            else:
+                assert actual == value, (wallet, name)
+
+def _same(actual, expected):
+    """Equal, counting NaN as equal to NaN"""
+    return actual == expected or (math.isnan(actual) and math.isnan(expected))
+
+def _random_metrics(rng, n):
+    """Metrics spanning every score cap and class threshold, with NaN where the reductions produce it"""
+    total = rng.integers(1, 200, n)
+    metrics = pd.DataFrame({
+        'spending_cv': rng.exponential(0.8, n),
+        'platform_tenure': rng.integers(0, 800, n),
+        'transaction_frequency': rng.exponential(1.5, n),
+        'unique_tokens': rng.integers(1, 8, n),
+        'avg_transaction': rng.lognormal(3, 2, n),
+        'recent_transactions': (total * rng.random(n)).astype(int),
+        'total_transactions': total,
+        'total_volume': rng.lognormal(6, 2.5, n),
+        'spending_consistency': rng.random(n),
+        'days_since_last_tx': rng.integers(0, 90, n),
+    })
+    metrics.loc[rng.random(n) < 0.1, 'spending_cv'] = np.nan
+    metrics.loc[rng.random(n) < 0.05, 'spending_consistency'] = np.nan
+    return metrics
+
+@pytest.mark.parametrize('seed', range(20))
+def test_array_kernels_match_scalar_versions(seed):
+    engine = MetaSenseReputationEngine(result_cache_size=0)
+    metrics = _random_metrics(np.random.default_rng(seed), 500)
+
+    scores = engine._calculate_reputation_scores_array(metrics)
+    class_codes = engine._classify_users(metrics, scores['overall_reputation'])
+    trust_codes = engine._determine_trust_levels(scores['overall_reputation'])
+
+    for i, row in enumerate(metrics.to_dict('records')):
+        expected = engine._calculate_reputation_scores(row)
+        for name, column in scores.items():
+            assert _same(float(column[i]), getattr(expected, name)), (seed, i, name)
+        assert USER_CLASSES[class_codes[i]] == engine._classify_user(row, expected), (seed, i)
+        assert TRUST_LEVELS[trust_codes[i]] == engine._determine_trust_level(expected.overall_reputation), (seed, i)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_round_1_matches_python_round(seed):
+    rng = np.random.default_rng(seed)
+    # Exact and near ties (x.x5 give or take a few ulps) are where np.round goes wrong
+    ties = (rng.integers(0, 100_000, 5_000) + 0.5) / 10
+    near_ties = np.concatenate([np.nextafter(ties, np.inf), np.nextafter(ties, -np.inf),
+                                ties * (1 + rng.integers(-4, 5, len(ties)) * np.finfo(float).eps)])
+    values = np.concatenate([ties, near_ties, -ties, rng.uniform(0, 1000, 5_000), [0.0, -0.0, np.nan]])
+
+    rounded = _round_1(values)
+    for value, actual in zip(values.tolist(), rounded.tolist()):
+        assert _same(actual, round(value, 1)), value
+
+def _chunked_metrics(chunk_rows, quantile_sketch_k=None):
+    aggregates = ChunkedSpendingAggregates(AS_OF, quantile_sketch_k)
+    for chunk in iter_spending_chunks(SAMPLE_CSV, chunk_rows):
+        aggregates.add_chunk(chunk)
+    return aggregates.to_metrics()
+
+def test_chunked_aggregates_do_not_depend_on_chunk_size():
+    # 37-row chunks push enough partials to exercise every merge level
+    pd.testing.assert_frame_equal(_chunked_metrics(37), _chunked_metrics(1_000_000), rtol=METRIC_RTOL)
+
+def test_chunked_and_state_metrics_match_grouped(sample_engine):
+    grouped = sample_engine._extract_all_behavioral_metrics(sample_engine.df, AS_OF)
+    grouped.index = grouped.index.astype(object).rename(None)
+    state = {}
+    sample_engine.update_aggregate_state(state)
+    from_state = sample_engine.analyze_from_state(state, AS_OF)
+
+    pd.testing.assert_frame_equal(_chunked_metrics(37), grouped, rtol=METRIC_RTOL, check_dtype=False)
+    for wallet, expected in grouped.iterrows():
+        metrics = from_state[wallet].behavioral_metrics
+        for name, value in expected.items():
+            if isinstance(value, float):
+                assert metrics[name] == pytest.approx(value, rel=METRIC_RTOL, nan_ok=True), (wallet, name)
+            else:
+                assert metrics[name] == value, (wallet, name)
+
+def test_sketched_chunked_metrics_only_approximate_amount_quantiles(sample_engine):
+    grouped = sample_engine._extract_all_behavioral_metrics(sample_engine.df, AS_OF)
+    grouped.index = grouped.index.astype(object).rename(None)
+    sketched = _chunked_metrics(37, quantile_sketch_k=8)
+
+    exact = grouped.columns.drop(['median_transaction', 'large_tx_ratio'])
+    pd.testing.assert_frame_equal(sketched[exact], grouped[exact], rtol=METRIC_RTOL, check_dtype=False)
@@ -0,0 +1,147 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the API latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+            'sum': self.sum,
+            'count': self.count
+        }
+
+class Instrumentation:
+    """Stage timers, counters, gauges and histograms shared by the collector and engine
+
+    Stage timers are inclusive (a stage running inside another counts
+    towards both) and, for stages run on several threads at once, summed
+    over threads. Everything can be exported as a JSON snapshot or as a
+    Prometheus text file. Safe to use from multiple threads.
+    """
+    def __init__(self, namespace="metafloat"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.stage_seconds = {}
+            self.stage_calls = {}
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one call of stage `name`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+                self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+
+    def timed(self, name):
+        """Decorator that times every call of a function as stage `name`"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """Record value in histogram `name` (created with buckets on first use)"""
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(buckets)
+            self.histograms[name].observe(value)
+
+    def snapshot(self):
+        """Plain-dict copy of every metric"""
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'elapsed_seconds': time.time() - self.started_at,
+                'stages': {name: {'seconds': seconds, 'calls': self.stage_calls[name]}
+                           for name, seconds in self.stage_seconds.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+            }
+
+    def to_prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        prefix = self.namespace
+        lines = [
+            f"# TYPE {prefix}_stage_seconds_total counter",
+            *(f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]}'
+              for name, stage in snapshot['stages'].items()),
+            f"# TYPE {prefix}_stage_calls_total counter",
+            *(f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["calls"]}'
+              for name, stage in snapshot['stages'].items()),
+        ]
+        for name, value in snapshot['counters'].items():
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        for name, value in snapshot['gauges'].items():
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        for name, histogram in snapshot['histograms'].items():
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            lines += [f'{prefix}_{name}_bucket{{le="{bound}"}} {count}'
+                      for bound, count in histogram['buckets'].items()]
+            lines += [f'{prefix}_{name}_bucket{{le="+Inf"}} {histogram["count"]}',
+                      f"{prefix}_{name}_sum {histogram['sum']}",
+                      f"{prefix}_{name}_count {histogram['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically write the Prometheus text file (e.g. for node_exporter's textfile collector)"""
+        _write_atomic(path, self.to_prometheus())
+        return path
+
+    def write_json(self, path):
+        """Atomically write a JSON snapshot"""
+        _write_atomic(path, json.dumps(self.snapshot(), indent=2))
+        return path
+
+def _write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+# Process-wide registry used by the collector and the reputation engine
+METRICS = Instrumentation()
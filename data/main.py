@@ -1,44 +1,745 @@
+import csv
+import itertools
+import json
+import logging
+from decimal import Decimal
+import os
 import requests
+import numpy as np
 import pandas as pd
+import sqlite3
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
 class RateLimiter:
-    """Ensures we never exceed API rate limits"""
-    def __init__(self, max_calls_per_second=3):  # Even more conservative
+    """Token-bucket limiter that adapts its rate to API feedback
+    
+    Calls are admitted at `rate` per second with bursts of up to `burst`.
+    The rate follows additive-increase / multiplicative-decrease: every
+    healthy response nudges it up by `increase_step` (never past
+    max_calls_per_second); a rate-limit error, HTTP 429, timeout or
+    latency spike cuts it by `decrease_factor`. Safe to share between
+    threads.
+    """
+    def __init__(self, max_calls_per_second=3, burst=None, min_calls_per_second=0.5,
+                 increase_step=0.1, decrease_factor=0.5, latency_spike_factor=3.0,
+                 backoff_cooldown=1.0):
         self.max_calls_per_second = max_calls_per_second
-        self.min_interval = 1.0 / max_calls_per_second
-        self.last_call_time = 0
+        self.min_calls_per_second = min_calls_per_second
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_spike_factor = latency_spike_factor
+        self.backoff_cooldown = backoff_cooldown
+        
+        self.rate = max_calls_per_second
+        self.capacity = burst if burst is not None else max_calls_per_second
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        
         self.call_count = 0
+        self.total_sleep_time = 0.0
+        self.backoff_count = 0
+        self.avg_latency = None
+        self.last_decrease = 0.0
+        self._lock = threading.Lock()
+        
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it
         
+        Lets a caller that holds other locks (see EndpointPool.acquire) do
+        the waiting itself, after releasing them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            
+            # Tokens may go negative: each waiting caller owns a slot in the queue
+            self.tokens -= 1
+            self.call_count += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.total_sleep_time += wait
+        METRICS.increment('rate_limiter_sleep_seconds', wait)
+        return wait
+            
+    def estimated_wait(self):
+        """Seconds the next call would wait, without taking a token"""
+        with self._lock:
+            tokens = min(self.capacity, self.tokens + (time.monotonic() - self.last_refill) * self.rate)
+            return (1 - tokens) / self.rate if tokens < 1 else 0.0
+            
     def wait_if_needed(self):
-        """Wait if necessary to respect rate limits"""
-        current_time = time.time()
-        time_since_last_call = current_time - self.last_call_time
-        
-        # Always wait the full interval for steady pulses (skip only on first call)
-        if self.last_call_time > 0 and time_since_last_call < self.min_interval:
-            sleep_time = self.min_interval - time_since_last_call
-            print(f"  ⏳ Rate limiting: sleeping {sleep_time:.2f}s...")
-            time.sleep(sleep_time)
-            
-        self.last_call_time = time.time()
-        self.call_count += 1
-        
-        # Extra safety: longer pause every 25 calls (was 50)
-        if self.call_count % 25 == 0:
-            print(f"  🛑 Extended safety pause after {self.call_count} API calls...")
-            time.sleep(5.0)  # Increased from 2 to 5 seconds
-            
-        # Super long pause every 100 calls for server recovery
-        if self.call_count % 100 == 0:
-            print(f"  🏥 Server recovery pause after {self.call_count} API calls...")
-            time.sleep(30.0)  # 30 second pause every 100 calls
+        """Block until a call is allowed"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+            
+    def record_response(self, latency, congested=False):
+        """Feed back the outcome of a call: latency in seconds, congested if throttled"""
+        with self._lock:
+            now = time.monotonic()
+            spike = (self.avg_latency is not None
+                     and latency > self.avg_latency * self.latency_spike_factor)
+            
+            if congested or spike:
+                # Calls already queued or in flight at the last cut report the
+                # same congestion; only back off once per episode
+                if now - latency < self.last_decrease + self.backoff_cooldown:
+                    return
+                self.last_decrease = now
+                self.rate = max(self.min_calls_per_second, self.rate * self.decrease_factor)
+                # Drop any saved-up burst so the cut takes effect immediately
+                self.tokens = min(self.tokens, 0)
+                self.backoff_count += 1
+                METRICS.increment('rate_limiter_backoffs')
+            else:
+                self.rate = min(self.max_calls_per_second, self.rate + self.increase_step)
+            METRICS.set_gauge('rate_limiter_calls_per_second', self.rate)
+                
+            if not congested:
+                self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+                
+    def stats(self):
+        """Snapshot of the limiter state"""
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'tokens': self.tokens,
+                'call_count': self.call_count,
+                'total_sleep_time': self.total_sleep_time,
+                'backoff_count': self.backoff_count,
+                'avg_latency': self.avg_latency
+            }
+
+ETHERSCAN_API_URL = "https://api.etherscan.io/v2/api"
+
+class Endpoint:
+    """One API endpoint: an explorer URL with its key, or a JSON-RPC node
+    
+    Each endpoint has its own rate budget (an adaptive RateLimiter) and
+    health state, maintained by EndpointPool.
+    """
+    def __init__(self, url, api_key=None, kind='explorer', max_calls_per_second=3, burst=None):
+        self.url = url
+        self.api_key = api_key
+        self.kind = kind
+        self.rate_limiter = RateLimiter(max_calls_per_second=max_calls_per_second, burst=burst)
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        
+    @property
+    def name(self):
+        host = self.url.split('//', 1)[-1].split('/', 1)[0]
+        return f"{host} (key ...{self.api_key[-4:]})" if self.api_key else host
+        
+    def expected_delay(self):
+        """Limiter wait plus observed latency: how soon a call here would complete"""
+        return self.rate_limiter.estimated_wait() + (self.rate_limiter.avg_latency or 0.0)
+
+class EndpointPool:
+    """Spreads requests over several endpoints (explorer keys, RPC nodes)
+    
+    Each request goes to the healthy endpoint of the requested kind that
+    would complete it soonest (remaining rate budget plus observed
+    latency). After eject_after consecutive failures an endpoint is
+    ejected for eject_seconds, doubling on every repeat up to
+    max_eject_seconds. Retries can exclude the endpoints that already
+    failed so they land elsewhere. Aggregate throughput is the sum of the
+    endpoints' budgets.
+    """
+    def __init__(self, endpoints, eject_after=3, eject_seconds=30.0, max_eject_seconds=600.0):
+        self.endpoints = list(endpoints)
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._lock = threading.Lock()
+        
+    def has(self, kind):
+        return any(endpoint.kind == kind for endpoint in self.endpoints)
+        
+    def budget(self, kind):
+        """Combined max calls/sec of every endpoint of a kind"""
+        return sum(endpoint.rate_limiter.max_calls_per_second for endpoint in self.endpoints if endpoint.kind == kind)
+        
+    def _choose_locked(self, kind, exclude):
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.kind == kind]
+        if not candidates:
+            raise ValueError(f"No {kind} endpoint configured")
+            
+        # If every endpoint is ejected, use the one that comes back first
+        now = time.monotonic()
+        healthy = ([endpoint for endpoint in candidates if endpoint.ejected_until <= now]
+                   or [min(candidates, key=lambda endpoint: endpoint.ejected_until)])
+        untried = [endpoint for endpoint in healthy if endpoint not in exclude] or healthy
+        return min(untried, key=Endpoint.expected_delay)
+        
+    def acquire(self, kind, exclude=()):
+        """Pick an endpoint of kind (avoiding exclude if possible) and wait for its rate budget"""
+        with self._lock:
+            endpoint = self._choose_locked(kind, exclude)
+            wait = endpoint.rate_limiter.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return endpoint
+        
+    def can_avoid(self, kind, exclude):
+        """True if some endpoint of kind is not in exclude, so a retry can go elsewhere"""
+        return any(endpoint.kind == kind and endpoint not in exclude for endpoint in self.endpoints)
+        
+    def record(self, endpoint, latency, ok=True, congested=False):
+        """Feed back a call's outcome; failures (including rate limiting) count towards ejection"""
+        endpoint.rate_limiter.record_response(latency, congested=congested)
+        with self._lock:
+            if ok:
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.failures += 1
+            # Calls that were in flight when it was ejected do not extend the ejection
+            if endpoint.ejected_until > time.monotonic():
+                return
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures < self.eject_after:
+                return
+            cooldown = min(self.max_eject_seconds, self.eject_seconds * 2 ** endpoint.ejections)
+            endpoint.ejected_until = time.monotonic() + cooldown
+            endpoint.ejections += 1
+            endpoint.consecutive_failures = 0
+        METRICS.increment('endpoint_ejections')
+        logger.warning(f"🚫 Ejecting {endpoint.name} for {cooldown:.0f}s after {self.eject_after} consecutive failures")
+        
+    def stats(self):
+        """Per-endpoint limiter and health counters"""
+        return [dict(endpoint.rate_limiter.stats(), name=endpoint.name, kind=endpoint.kind,
+                     max_calls_per_second=endpoint.rate_limiter.max_calls_per_second,
+                     failures=endpoint.failures, ejections=endpoint.ejections)
+                for endpoint in self.endpoints]
+
+def pooled_session(pool_size=16):
+    """requests.Session that keeps up to pool_size connections per host alive"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def iter_in_order(fn, items, max_in_flight, lookahead):
+    """Yield fn(item) for each item in input order, with up to max_in_flight calls running on one pool
+
+    Calls are submitted up to lookahead items ahead of the result being
+    yielded, so a slow call holds back its result but not new requests.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    try:
+        items = iter(items)
+        pending = deque(executor.submit(fn, item) for item in itertools.islice(items, lookahead))
+        while pending:
+            result = pending.popleft().result()
+            pending.extend(executor.submit(fn, item) for item in itertools.islice(items, 1))
+            yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def is_rate_limited_response(response, data):
+    """True if the API refused the call because of rate limiting"""
+    if response.status_code == 429:
+        return True
+    if data.get('status') == '0':
+        message = f"{data.get('message', '')} {data.get('result', '')}".lower()
+        return 'rate limit' in message
+    return False
+
+class ReceiptCache:
+    """Persistent SQLite cache of raw receipt logs by tx hash
+    
+    Receipts are immutable once mined, so a cached entry never goes stale.
+    Only the logs are stored: decoding depends on the token registry, which
+    can still resolve a token that was unknown when the receipt was cached.
+    The least recently used entries are evicted once the cache holds more
+    than max_entries receipts. Hits only note their access time in memory;
+    the notes are written in one transaction with the next put, every
+    touch_batch hits, or on close, so a warm rerun does not pay a commit
+    per receipt.
+    """
+    def __init__(self, path="receipt_cache.sqlite", max_entries=1_000_000, touch_batch=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_batch = touch_batch
+        self._touched = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS receipts (
+                tx_hash TEXT PRIMARY KEY,
+                logs TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS receipts_last_access ON receipts (last_access)")
+        self._conn.commit()
+        self.entries = self._conn.execute("SELECT COUNT(*) FROM receipts").fetchone()[0]
+        
+    def get_logs(self, tx_hash):
+        """Cached raw receipt logs for tx_hash, or None on a miss"""
+        key = tx_hash.lower()
+        with self._lock:
+            row = self._conn.execute("SELECT logs FROM receipts WHERE tx_hash = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                METRICS.increment('receipt_cache_misses')
+                return None
+            self.hits += 1
+            METRICS.increment('receipt_cache_hits')
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.touch_batch:
+                self._write_touched_locked()
+                self._conn.commit()
+            return json.loads(row[0])
+            
+    def put(self, tx_hash, logs):
+        """Store a receipt's logs"""
+        with self._lock:
+            key, logs, now = tx_hash.lower(), json.dumps(logs), time.time()
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO receipts (tx_hash, logs, last_access) VALUES (?, ?, ?)", (key, logs, now))
+            if cursor.rowcount:
+                self.entries += 1
+            else:
+                self._conn.execute("UPDATE receipts SET logs = ?, last_access = ? WHERE tx_hash = ?",
+                                   (logs, now, key))
+            self._touched.pop(key, None)
+            # Recency must be on disk before eviction picks the oldest entries
+            self._write_touched_locked()
+            if self.entries > self.max_entries:
+                self._evict_locked()
+            self._conn.commit()
+            
+    def _write_touched_locked(self):
+        if self._touched:
+            self._conn.executemany("UPDATE receipts SET last_access = ? WHERE tx_hash = ?",
+                                   [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched = {}
+            
+    def _evict_locked(self):
+        # Evict down to 90% so eviction does not run on every insert
+        target = int(self.max_entries * 0.9)
+        overflow = self.entries - target
+        self._conn.execute("""
+            DELETE FROM receipts WHERE tx_hash IN (
+                SELECT tx_hash FROM receipts ORDER BY last_access LIMIT ?
+            )
+        """, (overflow,))
+        self.evictions += overflow
+        self.entries = target
+        
+    def stats(self):
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self.entries,
+            'evictions': self.evictions
+        }
+        
+    def close(self):
+        with self._lock:
+            self._write_touched_locked()
+            self._conn.commit()
+            self._conn.close()
+
+# ERC-20 Transfer event signature: Transfer(address,address,uint256)
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+# ERC-20 symbol() and decimals() function selectors
+SYMBOL_SELECTOR = "0x95d89b41"
+DECIMALS_SELECTOR = "0x313ce567"
+
+# Common token mappings for Linea (lowercase addresses)
+KNOWN_TOKENS = {
+    "0x176211869ca2b568f2a7d4ee941e073a821ee1ff": ("USDC", 6),
+    "0xa219439258ca9da29e9cc4ce5596924745e12b93": ("USDT", 6),
+    "0x3ff47c5bf409c86533fe1f4907524d304062428d": ("EURe", 18),
+    "0xe5d7c2a44ffddf6b295a15c148167daaaf5cf34f": ("WETH", 18),
+}
+
+# Used for tokens whose metadata cannot be resolved
+UNKNOWN_TOKEN = ("UNKNOWN", 18)
+
+def decode_abi_symbol(result):
+    """symbol() return data as a string: ABI string, or bytes32 for older tokens"""
+    raw = bytes.fromhex(result[2:] if result.startswith('0x') else result)
+    if len(raw) >= 64 and int.from_bytes(raw[:32], 'big') == 32:
+        length = int.from_bytes(raw[32:64], 'big')
+        raw = raw[64:64 + length]
+    else:
+        raw = raw[:32].rstrip(b'\x00')
+    return raw.decode('utf-8', errors='replace').strip('\x00').strip()
+
+TRANSFER_COLUMNS = ['tx_index', 'log_index', 'from_address', 'to_address', 'token_address', 'amount_wei']
+
+def _transfer_rows(receipts, settlements=None):
+    """(tx_index, log_index, from_topic, to_topic, token, data) for every Transfer log
+    
+    settlements, if given, is a set of lowercase addresses without the 0x
+    prefix; only transfers to one of them are kept.
+    """
+    rows = []
+    append = rows.append
+    for tx_index, logs in enumerate(receipts):
+        for log_index, log in enumerate(logs):
+            topics = log.get('topics')
+            if not topics or len(topics) < 3:
+                continue
+            topic0 = topics[0]
+            if topic0 != TRANSFER_TOPIC and topic0.lower() != TRANSFER_TOPIC:
+                continue
+            to_topic = topics[2]
+            if settlements is not None and to_topic[-40:].lower() not in settlements:
+                continue
+            append((tx_index, log_index, topics[1], to_topic, log.get('address', ''), log.get('data', '0x')))
+    return rows
+
+def _amount_wei(data):
+    """uint256 from a Transfer's data field (0 if empty or malformed)"""
+    if not data or data == '0x':
+        return 0
+    try:
+        return int(data, 16)
+    except ValueError:
+        return 0
+
+def decode_transfer_columns(receipts, settlements=None):
+    """Decode the ERC-20 Transfer events of many receipts at once into columns
+    
+    receipts is a sequence of log lists. Returns TRANSFER_COLUMNS as numpy
+    arrays with one entry per transfer: the receipt's position in receipts,
+    the log's position in its receipt, lowercase from/to/token addresses
+    and amount_wei (Python ints, since amounts can exceed 64 bits). With
+    settlements (an iterable of addresses), only transfers to them are
+    decoded.
+    """
+    if settlements is not None:
+        settlements = {address.lower()[-40:] for address in settlements}
+    rows = _transfer_rows(receipts, settlements)
+    
+    return {
+        'tx_index': np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        'log_index': np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+        'from_address': np.array(["0x" + row[2][-40:].lower() for row in rows], dtype=object),
+        'to_address': np.array(["0x" + row[3][-40:].lower() for row in rows], dtype=object),
+        'token_address': np.array([row[4].lower() for row in rows], dtype=object),
+        'amount_wei': np.array([_amount_wei(row[5]) for row in rows], dtype=object)
+    }
+
+class TokenRegistry:
+    """Token symbol and decimals by address, resolved once and persisted
+    
+    Seeded with KNOWN_TOKENS. Any other token is resolved on first use by
+    calling symbol() and decimals() through eth_call (a callable taking
+    (token_address, calldata) and returning the hex result or None) and
+    saved to path, so each token is looked up once per registry file.
+    Tokens that cannot be resolved get UNKNOWN_TOKEN for the rest of the
+    process but are not persisted, so a later run retries them.
+    """
+    def __init__(self, eth_call=None, path="token_registry.json"):
+        self.eth_call = eth_call
+        self.path = path
+        self.lookups = 0
+        self._lock = threading.Lock()
+        self._tokens = dict(KNOWN_TOKENS)
+        self._unresolved = set()
+        
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._tokens.update((address, tuple(info)) for address, info in json.load(f).items())
+                
+    def __len__(self):
+        return len(self._tokens)
+        
+    def get(self, token_address):
+        """(symbol, decimals) for token_address"""
+        token_address = token_address.lower()
+        info = self._tokens.get(token_address)
+        if info is not None:
+            return info
+            
+        with self._lock:
+            # Another thread may have resolved it while we waited
+            info = self._tokens.get(token_address)
+            if info is None:
+                info = self._resolve_locked(token_address)
+            return info
+            
+    def _resolve_locked(self, token_address):
+        info = None
+        if self.eth_call is not None:
+            self.lookups += 1
+            METRICS.increment('token_lookups')
+            try:
+                symbol_result = self.eth_call(token_address, SYMBOL_SELECTOR)
+                decimals_result = self.eth_call(token_address, DECIMALS_SELECTOR)
+                if symbol_result and decimals_result and len(decimals_result) > 2:
+                    decimals = int(decimals_result, 16)
+                    symbol = decode_abi_symbol(symbol_result)
+                    if symbol and decimals <= 255:
+                        info = (symbol, decimals)
+            except ValueError as e:
+                logger.warning(f"Could not decode token metadata for {token_address}: {e}")
+                
+        if info is None:
+            logger.warning(f"⚠️ Unknown token {token_address}, assuming {UNKNOWN_TOKEN[1]} decimals")
+            self._unresolved.add(token_address)
+            self._tokens[token_address] = UNKNOWN_TOKEN
+            return UNKNOWN_TOKEN
+            
+        logger.info(f"🪙 Resolved token {token_address}: {info[0]} ({info[1]} decimals)")
+        self._tokens[token_address] = info
+        self._save_locked()
+        return info
+        
+    def _save_locked(self):
+        if not self.path:
+            return
+        resolved = {address: list(info) for address, info in self._tokens.items()
+                    if address not in KNOWN_TOKENS and address not in self._unresolved}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(resolved, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+SPENDING_COLUMNS = [
+    'transaction_hash', 'timestamp', 'block_number', 'user_wallet', 'settlement_address',
+    'amount', 'amount_wei', 'token_address', 'token_symbol', 'transaction_type', 'gas_used', 'gas_price'
+]
+
+def spending_arrow_table(df):
+    """Typed Arrow table for spending records (plus the derived date/hour columns)
+    
+    Addresses, symbols and categories are dictionary encoded, block numbers
+    and gas are int64, timestamps are datetime64 and amount_wei is exact
+    decimal text next to the float amount (a uint256 can have 78 digits,
+    more than Arrow's widest decimal holds). Requires pyarrow.
+    """
+    import pyarrow as pa
+    
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    timestamps = pd.to_datetime(df['timestamp'])
+    amount_wei = [None if pd.isna(value) else str(int(Decimal(str(value)))) for value in df['amount_wei']] \
+        if 'amount_wei' in df else [None] * len(df)
+    
+    columns = {
+        'transaction_hash': pa.array(df['transaction_hash'], pa.string()),
+        'timestamp': pa.array(timestamps, pa.timestamp('s')),
+        'block_number': pa.array(df['block_number'], pa.int64()),
+        'user_wallet': pa.array(df['user_wallet'], pa.string()).dictionary_encode(),
+        'settlement_address': pa.array(df['settlement_address'], pa.string()).dictionary_encode(),
+        'amount': pa.array(df['amount'], pa.float64()),
+        'amount_wei': pa.array(amount_wei, pa.string()),
+        'token_address': pa.array(df['token_address'], pa.string()).dictionary_encode(),
+        'token_symbol': pa.array(df['token_symbol'], pa.string()).dictionary_encode(),
+        'transaction_type': pa.array(df['transaction_type'], pa.string()).dictionary_encode(),
+        'gas_used': pa.array(df['gas_used'], pa.int64()),
+        'gas_price': pa.array(df['gas_price'], pa.int64()),
+        'date': pa.array(timestamps.dt.date, pa.date32()),
+        'hour': pa.array(timestamps.dt.hour, pa.int8()),
+        'day_of_week': pa.array(timestamps.dt.dayofweek, pa.int8()),
+        'is_weekend': pa.array(timestamps.dt.dayofweek >= 5, pa.bool_()),
+    }
+    schema = pa.schema([(name, dictionary if isinstance(array, pa.DictionaryArray) else array.type)
+                        for name, array in columns.items()])
+    return pa.Table.from_arrays(list(columns.values()), schema=schema)
+
+def load_spending_file(path):
+    """SPENDING_COLUMNS of a spending file written by save_spending_data (CSV or Parquet)"""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        df = pq.read_table(path, columns=SPENDING_COLUMNS).to_pandas()
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object)
+        # Same text form as freshly collected records
+        df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+        return df
+    return pd.read_csv(path, usecols=SPENDING_COLUMNS, dtype={'amount_wei': str})[SPENDING_COLUMNS]
+
+class SpendingCheckpoint:
+    """Append-only log of spending records plus a cursor to resume from
+    
+    Records are buffered and appended to the log in chunks, so memory stays
+    bounded however long the history is. After every flush the cursor is
+    rewritten atomically with the processed spans (see
+    pending_transactions) and the log size they correspond to; anything
+    appended past that size by a crashed run is truncated on resume.
+    Resuming any number of times, with new blocks listed in between,
+    processes every transaction once.
+    """
+    def __init__(self, prefix="metamask_collection_checkpoint", chunk_size=500, flush_every=50):
+        self.log_path = f"{prefix}.csv"
+        self.cursor_path = f"{prefix}_cursor.json"
+        self.chunk_size = chunk_size
+        self.flush_every = flush_every
+        
+        self.cursor = {}
+        if os.path.exists(self.cursor_path):
+            with open(self.cursor_path) as f:
+                self.cursor = json.load(f)
+                
+        self.buffer = []
+        self.pending_cursor = None
+        self.transactions_since_flush = 0
+        self.records_written = self.cursor.get('records_written', 0)
+        self.processed_count = self.cursor.get('processed_count', 0)
+        self.spans = [dict(span) for span in self.cursor.get('spans', [])]
+        
+    @property
+    def records_found(self):
+        return self.records_written + len(self.buffer)
+        
+    @property
+    def resumable(self):
+        return bool(self.cursor) and not self.cursor.get('complete', False)
+        
+    def reset(self):
+        """Discard any previous log and cursor and start a fresh collection"""
+        for path in (self.log_path, self.cursor_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.cursor = {}
+        self.spans = []
+        self.buffer = []
+        self.pending_cursor = None
+        self.transactions_since_flush = 0
+        self.records_written = 0
+        self.processed_count = 0
+        
+    def pending_transactions(self, contract_txs):
+        """Contract transactions (newest first) not yet covered by the cursor
+        
+        The cursor is a list of spans, newest first, one per listing a run
+        started from: a span covers the blocks above the next older span up
+        to its newest_block and was processed newest first down to its
+        last_tx_hash. Transactions mined since the newest span come first,
+        then what is left of each span.
+        """
+        if not self.resumable:
+            return contract_txs
+            
+        # Drop whatever a crashed run appended after its last cursor write
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > self.cursor['log_size']:
+            with open(self.log_path, 'r+') as f:
+                f.truncate(self.cursor['log_size'])
+                
+        spans = self.spans
+        if not spans:
+            return contract_txs
+        pending = [tx for tx in contract_txs if tx['block_number'] > spans[0]['newest_block']]
+        for i, span in enumerate(spans):
+            floor = spans[i + 1]['newest_block'] if i + 1 < len(spans) else -1
+            span_txs = [tx for tx in contract_txs if floor < tx['block_number'] <= span['newest_block']]
+            if span['last_tx_hash'] is not None:
+                hashes = [tx['hash'] for tx in span_txs]
+                if span['last_tx_hash'] not in hashes:
+                    logger.warning("⚠️ Checkpoint cursor not found in the transaction list - starting over")
+                    self.reset()
+                    return contract_txs
+                span_txs = span_txs[hashes.index(span['last_tx_hash']) + 1:]
+            pending.extend(span_txs)
+            
+        # Transactions mined after the interrupted run started are a new span, processed first
+        if pending and pending[0]['block_number'] > spans[0]['newest_block']:
+            spans.insert(0, {'newest_block': pending[0]['block_number'], 'last_tx_hash': None})
+        return pending
+        
+    def add(self, tx, records, newest_block):
+        """Record a processed transaction and its spending records"""
+        self.buffer.extend(records)
+        self.processed_count += 1
+        self.transactions_since_flush += 1
+        
+        spans = self.spans
+        if not spans:
+            spans.append({'newest_block': newest_block, 'last_tx_hash': None})
+        # Reaching an older span means the newer one is complete: they now form one span
+        while len(spans) > 1 and tx['block_number'] <= spans[1]['newest_block']:
+            spans[1]['newest_block'] = spans[0]['newest_block']
+            del spans[0]
+        spans[0]['last_tx_hash'] = tx['hash']
+        
+        self.pending_cursor = {'spans': [dict(span) for span in spans], 'last_block': tx['block_number']}
+        if len(self.buffer) >= self.chunk_size or self.transactions_since_flush >= self.flush_every:
+            self.flush()
+            
+    def add_records(self, records):
+        """Buffer spending records that are not tied to the transaction cursor"""
+        self.buffer.extend(records)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+            
+    @METRICS.timed('save')
+    def flush(self):
+        """Append buffered records to the log, then advance the cursor"""
+        if self.buffer:
+            write_header = not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0
+            with open(self.log_path, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=SPENDING_COLUMNS)
+                if write_header:
+                    writer.writeheader()
+                writer.writerows(self.buffer)
+                f.flush()
+                os.fsync(f.fileno())
+            self.records_written += len(self.buffer)
+            self.buffer = []
+            
+        if self.pending_cursor is not None:
+            self.cursor.update(self.pending_cursor)
+            self.pending_cursor = None
+        self.transactions_since_flush = 0
+        self._write_cursor()
+        
+    def mark_complete(self):
+        self.flush()
+        self.cursor['complete'] = True
+        self._write_cursor()
+        
+    def _write_cursor(self):
+        self.cursor['records_written'] = self.records_written
+        self.cursor['processed_count'] = self.processed_count
+        self.cursor['log_size'] = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        tmp_path = self.cursor_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.cursor, f, indent=2)
+        os.replace(tmp_path, self.cursor_path)
+        
+    def load_records(self):
+        """All logged spending records as a DataFrame"""
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0:
+            return pd.DataFrame(columns=SPENDING_COLUMNS)
+        # amount_wei can exceed int64, keep it as text. A transaction replayed after a
+        # crash logs the same records again; distinct transfers of one transaction differ in some column
+        return pd.read_csv(self.log_path, dtype={'amount_wei': str}).drop_duplicates(ignore_index=True)
 
 class MetamaskCardTransactionCollector:
-    def __init__(self, api_key, auto_discover_settlements=True):
+    def __init__(self, api_key, auto_discover_settlements=True, receipt_cache_path="receipt_cache.sqlite",
+                 listing_state_path="contract_listing_state.json", output_format="csv",
+                 token_registry_path="token_registry.json", rpc_url=None, receipt_batch_size=50,
+                 pool_size=16, request_timeout=(5, 15), receipt_timeout=(3, 10), receipts_by_block=False,
+                 endpoints=None):
         self.api_key = api_key
-        self.base_url = "https://api.etherscan.io/v2/api"
+        self.base_url = ETHERSCAN_API_URL
         self.chain_id = 59144  # FIXED: Correct Linea chain ID
         self.metamask_contract = "0x9dd23A4a0845f10d65D293776B792af1131c7B30"
         
@@ -50,177 +751,747 @@ class MetamaskCardTransactionCollector:
         self.auto_discover = auto_discover_settlements
         self.discovered_settlements = set()
         
-        # Rate limiter to prevent API overuse
-        self.rate_limiter = RateLimiter(max_calls_per_second=3)  # Reduced to 3 calls/sec
+        # Requests are spread over a pool of endpoints, each rate limited on its own
+        # budget; by default one explorer key at 3 calls/sec plus rpc_url if given
+        if endpoints is None:
+            endpoints = [Endpoint(self.base_url, api_key, 'explorer', max_calls_per_second=3)]
+            if rpc_url:
+                endpoints.append(Endpoint(rpc_url, kind='rpc', max_calls_per_second=3))
+        self.endpoints = endpoints if isinstance(endpoints, EndpointPool) else EndpointPool(endpoints)
+        
+        # Keep-alive connections, so calls after the first skip the TCP+TLS handshake
+        self.session = pooled_session(pool_size)
+        self.request_timeout = request_timeout
+        self.receipt_timeout = receipt_timeout
+        
+        # With JSON-RPC node endpoints, receipts are fetched receipt_batch_size per request
+        self.receipt_batch_size = receipt_batch_size
+        # Fetch all receipts of a block with one eth_getBlockReceipts call (needs an RPC endpoint);
+        # switched off for the run if the endpoint turns out not to support it
+        self.receipts_by_block = receipts_by_block and self.endpoints.has('rpc')
+        
+        # Receipts are immutable: reruns and settlement discovery read them from disk
+        self.receipt_cache = ReceiptCache(receipt_cache_path) if receipt_cache_path else None
+        
+        # Token symbols/decimals, resolved on chain once per unknown token
+        self.token_registry = TokenRegistry(self.eth_call, token_registry_path)
+        
+        # txlist returns at most this many rows per call; ranges that hit it are split
+        self.txlist_result_cap = 10000
+        self.getlogs_result_cap = 1000
+        self.listed_through_block = -1
+        # Highest block already processed, so later runs only list new blocks
+        self.listing_state_path = listing_state_path
         
-    def collect_all_card_transactions(self):
-        """Collect ALL MetaMask card transactions by analyzing contract activity"""
-        print(f"🔍 Collecting ALL MetaMask card transactions...")
-        print(f"Contract: {self.metamask_contract}")
-        print(f"Chain ID: {self.chain_id} (Linea)")
+        # 'csv' or 'parquet' (typed columnar, needs pyarrow) for the final spending file
+        self.output_format = output_format
         
-        all_spending_data = []
+    def collect_all_card_transactions(self, max_in_flight=1, checkpoint_prefix="metamask_collection_checkpoint",
+                                      incremental=True):
+        """Collect ALL MetaMask card transactions by analyzing contract activity
+        
+        With max_in_flight > 1, up to that many receipt requests are kept in
+        flight at once (still under the shared rate limiter). Progress is
+        appended to a checkpoint log, so an interrupted run picks up where
+        it stopped. With incremental=True only blocks after the previous
+        completed run are listed, and their purchases are merged into that
+        run's spending file, so the saved file always covers the full
+        history.
+        """
+        logger.info(f"🔍 Collecting ALL MetaMask card transactions...")
+        logger.info(f"Contract: {self.metamask_contract}")
+        logger.info(f"Chain ID: {self.chain_id} (Linea)")
+        
+        checkpoint = SpendingCheckpoint(checkpoint_prefix)
+        resumed = checkpoint.resumable
+        if not resumed:
+            checkpoint.reset()
         
         # Step 1: Get all transactions involving the contract (RATE LIMITED)
-        print("📋 Getting all contract transactions...")
-        contract_txs = self.get_all_contract_transactions()
-        print(f"Found {len(contract_txs)} contract transactions")
+        previous_file = self.load_spending_file() if incremental else None
+        start_block = self.load_listing_state() + 1 if previous_file else 0
+        if start_block > 0:
+            logger.info(f"📋 Getting contract transactions from block {start_block:,} (earlier blocks already processed)...")
+        else:
+            logger.info("📋 Getting all contract transactions...")
+        contract_txs = self.get_all_contract_transactions(start_block)
+        logger.info(f"Found {len(contract_txs)} contract transactions")
+        newest_block = contract_txs[0]['block_number'] if contract_txs else 0
         
         # Step 2: Discover settlement addresses if enabled (RATE LIMITED)
         if self.auto_discover:
-            print("🕵️ Auto-discovering settlement addresses...")
+            logger.info("🕵️ Auto-discovering settlement addresses...")
             self.discover_settlement_addresses(contract_txs[:25])  # Small sample to reduce API calls
         
         all_settlements = set(self.known_settlements + list(self.discovered_settlements))
-        print(f"👥 Tracking {len(all_settlements)} settlement addresses:")
+        logger.info(f"👥 Tracking {len(all_settlements)} settlement addresses:")
         for addr in all_settlements:
-            print(f"  - {addr}")
+            logger.info(f"  - {addr}")
+            
+        if resumed:
+            contract_txs = checkpoint.pending_transactions(contract_txs)
+            resumed = checkpoint.resumable
+            if resumed:
+                logger.info(f"♻️ Resuming from checkpoint: {checkpoint.processed_count} transactions already processed, "
+                      f"{checkpoint.records_written} purchases logged, {len(contract_txs)} to go")
         
         # Step 3: For each transaction, decode the token transfers (RATE LIMITED)
-        print("🔄 Analyzing token transfers in each transaction...")
-        print(f"⚠️ Rate limited to {self.rate_limiter.max_calls_per_second} calls/sec")
-        print(f"⏱️ Estimated time: {len(contract_txs) / self.rate_limiter.max_calls_per_second / 60:.1f} minutes")
-        print(f"💾 Will save preliminary data every 50 transactions for early inspection")
+        logger.info("🔄 Analyzing token transfers in each transaction...")
+        logger.info(f"⚠️ Rate limited to {self.endpoints.budget('explorer')} calls/sec")
+        logger.info(f"⏱️ Estimated time: {len(contract_txs) / self.endpoints.budget('explorer') / 60:.1f} minutes")
+        logger.info(f"💾 Checkpointing to {checkpoint.log_path} every {checkpoint.flush_every} transactions")
         
-        for i, tx in enumerate(contract_txs):
+        if max_in_flight > 1:
+            logger.info(f"🚀 Keeping up to {max_in_flight} receipt requests in flight")
+            
+        recent_records = []
+        stopped_early = False
+        
+        card_spending = self.iter_card_spending(contract_txs, all_settlements, max_in_flight)
+        for i, (tx, spending_records) in enumerate(card_spending):
             if i % 10 == 0:  # Frequent progress updates
                 elapsed = (time.time() - self.start_time) / 60 if hasattr(self, 'start_time') else 0
-                remaining = (len(contract_txs) - i) / self.rate_limiter.max_calls_per_second / 60
-                print(f"  📊 Progress: {i}/{len(contract_txs)} ({i/len(contract_txs)*100:.1f}%) | "
-                      f"Elapsed: {elapsed:.1f}min | ETA: {remaining:.1f}min | Found: {len(all_spending_data)} purchases")
+                remaining = (len(contract_txs) - i) / self.endpoints.budget('explorer') / 60
+                logger.info(f"  📊 Progress: {i}/{len(contract_txs)} ({i/len(contract_txs)*100:.1f}%) | "
+                      f"Elapsed: {elapsed:.1f}min | ETA: {remaining:.1f}min | Found: {checkpoint.records_found} purchases")
                 
-            tx_hash = tx['hash']
-            
-            # CRITICAL: This call is rate limited inside the function
-            transfers = self.get_token_transfers_from_transaction(tx_hash)
+            checkpoint.add(tx, spending_records, newest_block)
+            recent_records.extend(spending_records)
             
-            # Filter for transfers TO ANY settlement address (card purchases)
-            card_transfers = []
-            for transfer in transfers:
-                to_addr = transfer.get('to_address', '').lower()
-                if any(to_addr == settlement.lower() for settlement in all_settlements):
-                    card_transfers.append(transfer)
-            
-            if card_transfers:
-                # This transaction contains card spending!
-                for transfer in card_transfers:
-                    spending_record = {
-                        'transaction_hash': tx_hash,
-                        'timestamp': tx['timestamp'],
-                        'block_number': tx['block_number'],
-                        'user_wallet': transfer['from_address'],
-                        'settlement_address': transfer['to_address'],
-                        'amount': transfer['amount'],
-                        'token_address': transfer['token_address'],
-                        'token_symbol': transfer.get('symbol', 'UNKNOWN'),
-                        'transaction_type': 'card_purchase',
-                        'gas_used': tx.get('gas_used', 0),
-                        'gas_price': tx.get('gas_price', 0)
-                    }
-                    all_spending_data.append(spending_record)
-            
-            # 🔥 EARLY SAVE EVERY 50 TRANSACTIONS FOR INVESTIGATION
+            # 🔥 EARLY PREVIEW EVERY 50 TRANSACTIONS FOR INVESTIGATION
             if (i + 1) % 50 == 0:
-                self.save_preliminary_data(all_spending_data, i + 1, len(contract_txs))
+                self.save_preliminary_data(checkpoint, recent_records, i + 1, len(contract_txs))
+                recent_records = []
                 
                 # Ask user if they want to continue after seeing preliminary data
-                if (i + 1) == 50:  # After first 50
-                    if len(all_spending_data) == 0:
-                        print(f"\n⚠️ WARNING: No card purchases found in first 50 transactions!")
-                        print("This might indicate:")
-                        print("- Wrong contract address")
-                        print("- Wrong settlement address")
-                        print("- No recent card activity")
-                        print("- Contract not used for card transactions")
+                if (i + 1) == 50 and not resumed:  # After first 50
+                    if checkpoint.records_found == 0:
+                        logger.warning(f"\n⚠️ WARNING: No card purchases found in first 50 transactions!")
+                        logger.info("This might indicate:")
+                        logger.info("- Wrong contract address")
+                        logger.info("- Wrong settlement address")
+                        logger.info("- No recent card activity")
+                        logger.info("- Contract not used for card transactions")
                         
                         continue_anyway = input("\nContinue anyway? (y/n): ").strip().lower()
                         if continue_anyway != 'y':
-                            print("🛑 Stopping early. Check the preliminary data file for clues.")
+                            logger.info("🛑 Stopping early. Check the preliminary data file for clues.")
+                            stopped_early = True
                             break
                     else:
-                        print(f"\n✅ Found {len(all_spending_data)} card purchases in first 50 transactions!")
-                        print("This looks promising - continuing with full analysis...")
+                        logger.info(f"\n✅ Found {checkpoint.records_found} card purchases in first 50 transactions!")
+                        logger.info("This looks promising - continuing with full analysis...")
+                        
+        checkpoint.mark_complete()
+        logger.info(f"\n✅ Found {checkpoint.records_written} card purchases total!")
+        
+        filename = self.save_complete_spending_data(checkpoint.load_records(), previous_file)
+        if not stopped_early:
+            self.save_listing_state(self.listed_through_block, filename)
+        return filename
+            
+    def iter_card_spending(self, contract_txs, settlements, max_in_flight=1):
+        """Yield (tx, spending_records) for each contract transaction, in input order"""
+        settlements = {settlement.lower() for settlement in settlements}
+        for tx, transfers in self.iter_transaction_transfers(contract_txs, max_in_flight):
+            tx_hash = tx['hash']
+            
+            # Filter for transfers TO ANY settlement address (card purchases)
+            card_transfers = [transfer for transfer in transfers
+                              if transfer.get('to_address', '').lower() in settlements]
             
-        print(f"\n✅ Found {len(all_spending_data)} card purchases total!")
+            spending_records = []
+            for transfer in card_transfers:
+                # This transaction contains card spending!
+                spending_records.append({
+                    'transaction_hash': tx_hash,
+                    'timestamp': tx['timestamp'],
+                    'block_number': tx['block_number'],
+                    'user_wallet': transfer['from_address'],
+                    'settlement_address': transfer['to_address'],
+                    'amount': transfer['amount'],
+                    'amount_wei': transfer['amount_wei'],
+                    'token_address': transfer['token_address'],
+                    'token_symbol': transfer.get('symbol', 'UNKNOWN'),
+                    'transaction_type': 'card_purchase',
+                    'gas_used': tx.get('gas_used', 0),
+                    'gas_price': tx.get('gas_price', 0)
+                })
+                
+            yield tx, spending_records
+            
+    def iter_spending_batches(self, start_block=0, max_in_flight=1):
+        """Yield lists of spending records in receipt mode, one per 50 contract transactions
         
-        if all_spending_data:
-            filename = self.save_to_csv(all_spending_data)
-            print(f"💾 Data saved to {filename}")
-            return filename
-        else:
-            print("❌ No card purchases found")
+        Lists contract transactions from start_block, discovers settlements
+        if enabled, then streams card spending without any checkpoint or
+        CSV. self.listed_through_block is set once listing is done.
+        """
+        contract_txs = self.get_all_contract_transactions(start_block)
+        if self.auto_discover:
+            logger.info("🕵️ Auto-discovering settlement addresses...")
+            self.discover_settlement_addresses(contract_txs[:25])
+        all_settlements = set(self.known_settlements + list(self.discovered_settlements))
+        
+        batch = []
+        for i, (tx, spending_records) in enumerate(self.iter_card_spending(contract_txs, all_settlements, max_in_flight)):
+            batch.extend(spending_records)
+            if (i + 1) % 50 == 0:
+                logger.info(f"  📊 Progress: {i + 1}/{len(contract_txs)} transactions streamed")
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+            
+    def iter_transaction_transfers(self, contract_txs, max_in_flight=1, window=50):
+        """Yield (tx, transfers) for each contract transaction, in input order"""
+        if self.receipts_by_block:
+            yield from self.iter_transfers_by_block(contract_txs, max_in_flight, window)
+            return
+            
+        if self.endpoints.has('rpc'):
+            # Batched receipts: a window covers every batch that can be in flight at once
+            window = max(window, self.receipt_batch_size * max_in_flight)
+            for start in range(0, len(contract_txs), window):
+                batch = contract_txs[start:start + window]
+                yield from zip(batch, self.get_token_transfers_batch([tx['hash'] for tx in batch], max_in_flight))
+            return
+            
+        if max_in_flight <= 1:
+            for tx in contract_txs:
+                # CRITICAL: This call is rate limited inside the function
+                yield tx, self.get_token_transfers_from_transaction(tx['hash'])
+            return
+            
+        # One pool for the whole run; the lookahead keeps every worker busy past a slow receipt
+        transfers = iter_in_order(self.get_token_transfers_from_transaction, (tx['hash'] for tx in contract_txs),
+                                  max_in_flight, lookahead=max(window, 2 * max_in_flight))
+        yield from zip(contract_txs, transfers)
+            
+    def iter_transfers_by_block(self, contract_txs, max_in_flight=1, window=50):
+        """Yield (tx, transfers) in input order, fetching receipts one block at a time where that is cheaper
+        
+        Uncached transactions in each window are grouped by block_number.
+        A block gets a single eth_getBlockReceipts call only when that takes
+        fewer requests than batching its receipts; the rest, including
+        anything a block call did not cover, goes out as full batched
+        receipt requests, with a partial batch carried into the next window.
+        Windows never split a block. Logs how many API calls this saved
+        compared with batched receipt requests alone.
+        """
+        # Same window as the batched mode, so both keep max_in_flight requests busy
+        window = max(window, self.receipt_batch_size * max_in_flight)
+        block_calls = 0
+        block_receipts = 0
+        batch_calls = 0
+        fetched = 0
+        
+        transfers = {}
+        pending = []
+        rest = []
+        executor = ThreadPoolExecutor(max_workers=max_in_flight) if max_in_flight > 1 else None
+        try:
+            start = 0
+            while start < len(contract_txs):
+                end = min(start + window, len(contract_txs))
+                while end < len(contract_txs) and contract_txs[end]['block_number'] == contract_txs[end - 1]['block_number']:
+                    end += 1
+                batch = contract_txs[start:end]
+                start = end
+                pending.extend(batch)
+                
+                blocks = {}
+                for tx in batch:
+                    cached = self._cached_transfers(tx['hash'])
+                    if cached is None:
+                        blocks.setdefault(tx['block_number'], []).append(tx['hash'])
+                    else:
+                        transfers[tx['hash']] = cached
+                fetched += sum(len(tx_hashes) for tx_hashes in blocks.values())
+                
+                fetch_blocks = self._blocks_worth_fetching(blocks) if self.receipts_by_block else []
+                if executor is not None and len(fetch_blocks) > 1:
+                    results = list(executor.map(self.fetch_block_receipts, fetch_blocks))
+                else:
+                    results = [self.fetch_block_receipts(block) for block in fetch_blocks]
+                block_calls += len(fetch_blocks)
+                
+                for block, logs_by_hash in zip(fetch_blocks, results):
+                    if logs_by_hash is None:
+                        continue
+                    for tx_hash in blocks[block]:
+                        logs = logs_by_hash.get(tx_hash.lower())
+                        if logs is None:
+                            continue
+                        transfers[tx_hash] = self.decode_all_transfer_events(logs)
+                        if self.receipt_cache is not None:
+                            self.receipt_cache.put(tx_hash, logs)
+                        block_receipts += 1
+                        
+                # Single-transaction blocks and block call fallbacks share the batched requests
+                rest.extend(tx_hash for tx_hashes in blocks.values() for tx_hash in tx_hashes
+                            if tx_hash not in transfers)
+                ready = len(rest) if start >= len(contract_txs) else len(rest) - len(rest) % self.receipt_batch_size
+                transfers.update(self._fetch_transfers(rest[:ready], max_in_flight, executor))
+                batch_calls += self._batch_count(ready)
+                rest = rest[ready:]
+                
+                done = 0
+                while done < len(pending) and pending[done]['hash'] in transfers:
+                    done += 1
+                yield from ((tx, transfers[tx['hash']]) for tx in pending[:done])
+                for tx in pending[:done]:
+                    transfers.pop(tx['hash'], None)
+                pending = pending[done:]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+                
+        saved = self._batch_count(fetched) - block_calls - batch_calls
+        METRICS.increment('block_receipt_calls', block_calls)
+        METRICS.increment('api_calls_saved', saved)
+        logger.info(f"📦 eth_getBlockReceipts: {block_calls:,} calls served {block_receipts:,} receipts "
+                    f"({saved:,} API calls saved against batched receipts)")
+        
+    def _batch_count(self, count):
+        """Batched receipt requests needed for count transactions"""
+        return -(-count // self.receipt_batch_size)
+        
+    def _blocks_worth_fetching(self, blocks):
+        """Blocks to fetch whole so that block calls plus batched receipts for the rest take the fewest requests
+        
+        blocks maps block_number to its uncached tx hashes. For any number of
+        block calls, spending them on the blocks with the most transactions
+        leaves the fewest receipts to batch, so only the largest blocks are
+        ever picked.
+        """
+        by_size = sorted((block for block, tx_hashes in blocks.items() if len(tx_hashes) > 1),
+                         key=lambda block: len(blocks[block]), reverse=True)
+        remaining = sum(len(tx_hashes) for tx_hashes in blocks.values())
+        best_calls, best_count = self._batch_count(remaining), 0
+        for count, block in enumerate(by_size, 1):
+            remaining -= len(blocks[block])
+            calls = count + self._batch_count(remaining)
+            if calls < best_calls:
+                best_calls, best_count = calls, count
+        return by_size[:best_count]
+        
+    @METRICS.timed('fetch')
+    def fetch_block_receipts(self, block_number):
+        """{tx_hash: logs} for every receipt in a block, or None if unavailable
+        
+        An endpoint that rejects eth_getBlockReceipts switches
+        receipts_by_block off, so the rest of the run fetches per
+        transaction.
+        """
+        if not self.receipts_by_block:
+            return None
+            
+        payload = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_getBlockReceipts', 'params': [hex(block_number)]}
+        reply = self._rpc_post(payload, f"receipts of block {block_number:,}")
+        if reply is None:
             return None
             
-    def get_all_contract_transactions(self):
-        """Get ALL transactions involving the MetaMask contract (RATE LIMITED)"""
-        print("🔄 Fetching contract transactions (rate limited)...")
-        # CRITICAL: Rate limit this call too!
-        self.rate_limiter.wait_if_needed()
+        error = reply.get('error')
+        if error or not isinstance(reply.get('result'), list):
+            if error and (error.get('code') in (-32601, -32602) or 'not supported' in str(error.get('message', '')).lower()):
+                logger.warning(f"⚠️ Endpoint does not support eth_getBlockReceipts ({error.get('message')}), "
+                               f"fetching receipts per transaction")
+                self.receipts_by_block = False
+            else:
+                METRICS.increment('api_errors')
+                logger.warning(f"No receipts for block {block_number:,}: {error or reply}")
+            return None
+            
+        return {receipt['transactionHash'].lower(): receipt.get('logs', [])
+                for receipt in reply['result'] if receipt and receipt.get('transactionHash')}
+        
+    @METRICS.timed('list')
+    def get_all_contract_transactions(self, start_block=0, end_block=None):
+        """Get ALL transactions involving the MetaMask contract (RATE LIMITED)
+        
+        Walks [start_block, end_block] in block ranges. A range that comes
+        back at the API's result cap is split in half and retried, and the
+        range size grows again once results thin out. Returns transactions
+        newest first; self.listed_through_block is the last block fully
+        covered.
+        """
+        logger.info("🔄 Fetching contract transactions (rate limited)...")
+        
+        head_known = end_block is not None
+        if end_block is None:
+            end_block = self.get_latest_block_number()
+            head_known = bool(end_block)
+            if not head_known:
+                logger.warning("⚠️ Chain head unknown, listing to the end of the chain")
+                end_block = 99999999
+                
+        transactions = {}
+        self.listed_through_block = start_block - 1
         
+        for high, batch in self._walk_block_ranges(start_block, end_block, self._fetch_txlist_range,
+                                                   self.txlist_result_cap):
+            for tx in batch:
+                transactions[tx['hash']] = tx
+            self.listed_through_block = high
+            
+        if not head_known:
+            # The walk ends at the sentinel, not the head; only blocks that were seen count as listed
+            self.listed_through_block = min(self.listed_through_block,
+                                            max((tx['block_number'] for tx in transactions.values()),
+                                                default=start_block - 1))
+            
+        logger.info(f"📦 Listed {len(transactions):,} transactions through block {self.listed_through_block:,}")
+        return sorted(transactions.values(), key=lambda tx: tx['block_number'], reverse=True)
+        
+    def _walk_block_ranges(self, start_block, end_block, fetch_range, result_cap):
+        """Yield (high, rows) for consecutive block ranges covering [start_block, end_block]
+        
+        fetch_range(low, high) returns the rows for a range, or None on
+        failure (which ends the walk). A range that comes back at
+        result_cap rows may be truncated, so it is split in half and
+        retried; the step shrinks accordingly and doubles again while
+        results are sparse.
+        """
+        span = end_block - start_block + 1
+        next_block = start_block
+        pending_ranges = []  # Split halves, lower half on top
+        
+        while pending_ranges or next_block <= end_block:
+            if pending_ranges:
+                low, high = pending_ranges.pop()
+            else:
+                low, high = next_block, min(next_block + span - 1, end_block)
+                next_block = high + 1
+                
+            rows = fetch_range(low, high)
+            if rows is None:
+                logger.error(f"❌ Listing stopped at block {low}; later blocks will be fetched next run")
+                return
+                
+            if len(rows) >= result_cap and low < high:
+                mid = (low + high) // 2
+                pending_ranges.extend([(mid + 1, high), (low, mid)])
+                span = max(1, (high - low + 1) // 2)
+                continue
+            if len(rows) >= result_cap:
+                logger.warning(f"⚠️ Block {low} alone hits the {result_cap} result cap; results may be incomplete")
+                
+            yield high, rows
+            if len(rows) < result_cap // 4:
+                span *= 2
+                
+    def get_latest_block_number(self):
+        """Current chain head via the explorer proxy, or None if unavailable"""
         params = {
             'chainid': self.chain_id,
-            'module': 'account',
-            'action': 'txlist',
-            'address': self.metamask_contract,
-            'startblock': 0,
-            'endblock': 99999999,
-            'sort': 'desc',
-            'apikey': self.api_key
+            'module': 'proxy',
+            'action': 'eth_blockNumber'
         }
+        data = self._api_request(params, "latest block number")
+        try:
+            return int(data['result'], 16)
+        except (TypeError, KeyError, ValueError):
+            logger.warning(f"Could not get latest block number: {data}")
+            return None
+            
+    def load_listing_state(self):
+        """Highest block covered by a previous completed run (-1 if none)"""
+        return self._listing_state().get('highest_block', -1)
+        
+    def load_spending_file(self):
+        """Complete spending file written with the listing state, or None if there is none to extend"""
+        path = self._listing_state().get('spending_file')
+        if path and not os.path.exists(path):
+            logger.warning(f"⚠️ Previous spending file {path} is gone, collecting the full history again")
+            return None
+        return path
+        
+    def _listing_state(self):
+        if not self.listing_state_path or not os.path.exists(self.listing_state_path):
+            return {}
+        with open(self.listing_state_path) as f:
+            state = json.load(f)
+        if state.get('contract', '').lower() != self.metamask_contract.lower():
+            return {}
+        return state
         
+    def save_listing_state(self, highest_block, spending_file=None):
+        """Remember how far the contract history has been processed
+        
+        spending_file is the complete spending file through highest_block,
+        which the next incremental collection extends. Without one (the
+        streaming pipeline keeps its history elsewhere) the next collection
+        lists the full history again.
+        """
+        if not self.listing_state_path:
+            return
+        state = {'contract': self.metamask_contract, 'highest_block': highest_block}
+        if spending_file:
+            state['spending_file'] = spending_file
+        tmp_path = self.listing_state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.listing_state_path)
+            
+    def _api_request(self, params, description, timeout=None):
+        """Rate-limited explorer GET with retries; parsed JSON, or None if every attempt failed
+        
+        Each attempt goes to the best explorer endpoint in the pool, and a
+        retry avoids the endpoints that already failed when it can.
+        """
         max_retries = 3
+        failed = set()
         for attempt in range(max_retries):
+            if attempt:
+                METRICS.increment('api_retries')
+            # CRITICAL: Rate limit EVERY API call, retries included
+            endpoint = self.endpoints.acquire('explorer', exclude=failed)
+            METRICS.increment('api_calls')
+            started = time.monotonic()
             try:
                 # Add timeout to prevent SSL hangs
-                response = requests.get(self.base_url, params=params, timeout=(5, 15))
+                response = self.session.get(endpoint.url, params=dict(params, apikey=endpoint.api_key),
+                                            timeout=timeout or self.request_timeout)
+                METRICS.observe('api_latency_seconds', time.monotonic() - started)
                 data = response.json()
                 
-                if data.get('status') == '1':
-                    transactions = []
-                    for tx in data.get('result', []):
-                        transactions.append({
-                            'hash': tx.get('hash'),
-                            'timestamp': datetime.fromtimestamp(int(tx.get('timeStamp', 0))).isoformat(),
-                            'from_address': tx.get('from'),
-                            'to_address': tx.get('to'),
-                            'block_number': int(tx.get('blockNumber', 0)),
-                            'gas_used': int(tx.get('gasUsed', 0)),
-                            'gas_price': int(tx.get('gasPrice', 0)),
-                            'input_data': tx.get('input', '')
-                        })
-                        
-                    return transactions
-                else:
-                    print(f"API Error: {data.get('message', 'Unknown error')}")
-                    return []
-                    
+                if is_rate_limited_response(response, data):
+                    METRICS.increment('api_rate_limited')
+                    self.endpoints.record(endpoint, time.monotonic() - started, ok=False, congested=True)
+                    failed.add(endpoint)
+                    logger.warning(f"🚦 Rate limited by {endpoint.name} on attempt {attempt + 1}/{max_retries}, "
+                                   f"slowing it to {endpoint.rate_limiter.rate:.2f} calls/sec")
+                    continue
+                self.endpoints.record(endpoint, time.monotonic() - started)
+                return data
+                
             except requests.exceptions.Timeout:
-                print(f"⏰ Timeout on attempt {attempt + 1}/{max_retries} for contract transactions")
-                if attempt < max_retries - 1:
+                METRICS.increment('api_timeouts')
+                self.endpoints.record(endpoint, time.monotonic() - started, ok=False, congested=True)
+                failed.add(endpoint)
+                logger.warning(f"⏰ Timeout on attempt {attempt + 1}/{max_retries} for {description} from {endpoint.name}")
+                if attempt < max_retries - 1 and not self.endpoints.can_avoid('explorer', failed):
                     time.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s
-                    continue
-                else:
-                    print("❌ All retry attempts failed for contract transactions")
-                    return []
             except Exception as e:
-                print(f"Error getting contract transactions (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
+                METRICS.increment('api_errors')
+                self.endpoints.record(endpoint, time.monotonic() - started, ok=False)
+                failed.add(endpoint)
+                logger.warning(f"Error getting {description} from {endpoint.name} (attempt {attempt + 1}): {e}")
+                if attempt < max_retries - 1 and not self.endpoints.can_avoid('explorer', failed):
                     time.sleep(2 ** attempt)
-                    continue
-                else:
-                    return []
-             
+                    
+        METRICS.increment('api_failures')
+        logger.error(f"❌ All retry attempts failed for {description}")
+        return None
+        
+    def eth_call(self, to, data):
+        """Hex result of a read-only contract call at the latest block, or None"""
+        params = {
+            'chainid': self.chain_id,
+            'module': 'proxy',
+            'action': 'eth_call',
+            'to': to,
+            'data': data,
+            'tag': 'latest'
+        }
+        result = self._api_request(params, f"eth_call {data} on {to}")
+        if not result or not isinstance(result.get('result'), str) or not result['result'].startswith('0x'):
+            return None
+        return result['result']
+        
+    def _fetch_txlist_range(self, start_block, end_block):
+        """One txlist call for a block range; None if it could not be fetched"""
+        params = {
+            'chainid': self.chain_id,
+            'module': 'account',
+            'action': 'txlist',
+            'address': self.metamask_contract,
+            'startblock': start_block,
+            'endblock': end_block,
+            'sort': 'asc'
+        }
+        
+        data = self._api_request(params, f"contract transactions in blocks {start_block}-{end_block}")
+        if data is None:
+            return None
+            
+        if data.get('status') == '1':
+            transactions = []
+            for tx in data.get('result', []):
+                transactions.append({
+                    'hash': tx.get('hash'),
+                    'timestamp': datetime.fromtimestamp(int(tx.get('timeStamp', 0))).isoformat(),
+                    'from_address': tx.get('from'),
+                    'to_address': tx.get('to'),
+                    'block_number': int(tx.get('blockNumber', 0)),
+                    'gas_used': int(tx.get('gasUsed', 0)),
+                    'gas_price': int(tx.get('gasPrice', 0)),
+                    'input_data': tx.get('input', '')
+                })
+                
+            return transactions
+        elif data.get('message') == 'No transactions found':
+            return []
+        else:
+            logger.error(f"API Error: {data.get('message', 'Unknown error')}")
+            return None
+            
+    def collect_card_transactions_from_logs(self, incremental=True, checkpoint_prefix="metamask_logs_checkpoint"):
+        """Collect card purchases from ERC-20 Transfer logs to the settlement addresses
+        
+        Queries getLogs by topic (Transfer, to = settlement) over block
+        ranges instead of fetching one receipt per contract transaction, and
+        writes the same spending-record schema as
+        collect_all_card_transactions, merged into the previous run's file
+        when incremental. Settlement auto-discovery still samples receipts
+        of recent contract transactions.
+        """
+        logger.info(f"🔍 Collecting MetaMask card purchases from Transfer logs...")
+        logger.info(f"Chain ID: {self.chain_id} (Linea)")
+        previous_file = self.load_spending_file() if incremental else None
+        start_block = self.load_listing_state() + 1 if previous_file else 0
+        
+        checkpoint = SpendingCheckpoint(checkpoint_prefix)
+        checkpoint.reset()
+        
+        calls_before = METRICS.snapshot()['counters'].get('api_calls', 0)
+        for records in self.iter_spending_batches_from_logs(start_block):
+            checkpoint.add_records(records)
+            
+        checkpoint.mark_complete()
+        logger.info(f"\n✅ Found {checkpoint.records_written} card purchases with "
+              f"{METRICS.snapshot()['counters'].get('api_calls', 0) - calls_before:,} API calls")
+        
+        records = checkpoint.load_records().sort_values(['block_number', 'transaction_hash'],
+                                                        ascending=False, kind='stable')
+        filename = self.save_complete_spending_data(records, previous_file)
+        self.save_listing_state(self.listed_through_block, filename)
+        return filename
+            
+    def iter_spending_batches_from_logs(self, start_block=0, end_block=None):
+        """Yield lists of spending records from Transfer logs, one per block range
+        
+        After the generator is exhausted, self.listed_through_block is the
+        last block covered for every settlement address. The listing state
+        is not saved here; callers do that once the records are persisted.
+        """
+        if self.auto_discover:
+            logger.info("🕵️ Auto-discovering settlement addresses...")
+            self.discover_settlement_addresses(self.get_recent_contract_transactions(25))
+            
+        all_settlements = sorted({s.lower() for s in self.known_settlements} | self.discovered_settlements)
+        logger.info(f"👥 Tracking {len(all_settlements)} settlement addresses:")
+        for addr in all_settlements:
+            logger.info(f"  - {addr}")
+            
+        if end_block is None:
+            end_block = self.get_latest_block_number()
+            if not end_block:
+                # Without the head there is no block every settlement is known to be scanned through
+                logger.error("❌ Chain head unknown, skipping the log scan; it resumes next run")
+                self.listed_through_block = start_block - 1
+                return
+        logger.info(f"📋 Scanning Transfer logs in blocks {start_block:,}-{end_block:,}...")
+        
+        covered_through = end_block
+        for settlement in all_settlements:
+            fetch_range = lambda low, high: self._fetch_transfer_logs_range(settlement, low, high)
+            settlement_through = start_block - 1
+            found = 0
+            
+            for high, logs in self._walk_block_ranges(start_block, end_block, fetch_range, self.getlogs_result_cap):
+                records = self._spending_records_from_logs(logs)
+                found += len(records)
+                settlement_through = high
+                yield records
+                
+            covered_through = min(covered_through, settlement_through)
+            logger.info(f"  {settlement}: scanned through block {settlement_through:,} | Found: {found} purchases")
+            
+        self.listed_through_block = covered_through
+        
+    @METRICS.timed('list')
+    def get_recent_contract_transactions(self, count):
+        """The latest `count` contract transactions, newest first (one API call)"""
+        params = {
+            'chainid': self.chain_id,
+            'module': 'account',
+            'action': 'txlist',
+            'address': self.metamask_contract,
+            'startblock': 0,
+            'endblock': 99999999,
+            'page': 1,
+            'offset': count,
+            'sort': 'desc'
+        }
+        data = self._api_request(params, "recent contract transactions")
+        if not data or data.get('status') != '1':
+            return []
+        return [{'hash': tx.get('hash'), 'block_number': int(tx.get('blockNumber', 0))}
+                for tx in data.get('result', [])]
+                
+    @METRICS.timed('fetch')
+    def _fetch_transfer_logs_range(self, settlement, start_block, end_block):
+        """Transfer logs to one settlement address in a block range; None on failure"""
+        params = {
+            'chainid': self.chain_id,
+            'module': 'logs',
+            'action': 'getLogs',
+            'fromBlock': start_block,
+            'toBlock': end_block,
+            'topic0': TRANSFER_TOPIC,
+            'topic0_2_opr': 'and',
+            'topic2': '0x' + settlement[2:].lower().rjust(64, '0'),
+            'page': 1,
+            'offset': self.getlogs_result_cap
+        }
+        
+        data = self._api_request(params, f"Transfer logs in blocks {start_block}-{end_block}")
+        if data is None:
+            return None
+        if data.get('status') == '1':
+            return data.get('result', [])
+        if data.get('message') == 'No records found':
+            return []
+        logger.error(f"API Error: {data.get('message', 'Unknown error')}")
+        return None
+        
+    def _spending_records_from_logs(self, logs):
+        """Spending records for a page of Transfer logs returned by getLogs"""
+        transfers = self.decode_transfer_batch((logs,))
+        records = []
+        for i, log_index in enumerate(transfers['log_index']):
+            log = logs[log_index]
+            amount_wei = transfers['amount_wei'][i]
+            records.append({
+                'transaction_hash': log.get('transactionHash'),
+                'timestamp': datetime.fromtimestamp(int(log.get('timeStamp', '0x0'), 16)).isoformat(),
+                'block_number': int(log.get('blockNumber', '0x0'), 16),
+                'user_wallet': transfers['from_address'][i],
+                'settlement_address': transfers['to_address'][i],
+                'amount': float(transfers['amount'][i]) if amount_wei > 0 else 0,
+                'amount_wei': amount_wei,
+                'token_address': transfers['token_address'][i],
+                'token_symbol': transfers['symbol'][i],
+                'transaction_type': 'card_purchase',
+                'gas_used': int(log.get('gasUsed', '0x0') or '0x0', 16),
+                'gas_price': int(log.get('gasPrice', '0x0') or '0x0', 16)
+            })
+        return records
+        
+    @METRICS.timed('discover')
     def discover_settlement_addresses(self, sample_transactions):
         """Discover settlement addresses by analyzing transaction patterns (RATE LIMITED)"""
-        print("🔍 Analyzing transaction patterns to discover settlement addresses...")
-        print(f"⏳ Sampling {len(sample_transactions)} transactions with rate limiting...")
+        logger.info("🔍 Analyzing transaction patterns to discover settlement addresses...")
+        logger.info(f"⏳ Sampling {len(sample_transactions)} transactions with rate limiting...")
         
         recipient_frequency = {}
         
         # Analyze a sample of transactions to find common recipients
         for i, tx in enumerate(sample_transactions):
             if i % 5 == 0:
-                print(f"  🔍 Discovery progress: {i}/{len(sample_transactions)} transactions...")
+                logger.info(f"  🔍 Discovery progress: {i}/{len(sample_transactions)} transactions...")
                 
             tx_hash = tx['hash']
             # This call includes rate limiting
@@ -240,184 +1511,337 @@ class MetamaskCardTransactionCollector:
         # Sort by frequency
         potential_settlements.sort(key=lambda x: x[1], reverse=True)
         
-        print("🎯 Potential settlement addresses found:")
+        logger.info("🎯 Potential settlement addresses found:")
         for addr, count in potential_settlements[:5]:  # Top 5
-            print(f"  {addr} - appears in {count} transactions")
+            logger.info(f"  {addr} - appears in {count} transactions")
             if addr not in [s.lower() for s in self.known_settlements]:
                 self.discovered_settlements.add(addr)
                 
         return potential_settlements
         
-    def get_token_transfers_from_transaction(self, tx_hash):
-        """Get ALL token transfers from a specific transaction hash (RATE LIMITED)"""
-        # CRITICAL: Rate limit EVERY API call
-        self.rate_limiter.wait_if_needed()
+    def get_token_transfers_batch(self, tx_hashes, max_in_flight=1):
+        """Token transfers for many transactions via batched JSON-RPC receipts, in input order
         
-        params = {
-            'chainid': self.chain_id,
-            'module': 'proxy',
-            'action': 'eth_getTransactionReceipt',
-            'txhash': tx_hash,
-            'apikey': self.api_key
-        }
+        Cached receipts are served from the receipt cache; the rest are
+        fetched receipt_batch_size per request from the RPC endpoints, with up
+        to max_in_flight requests at once.
+        """
+        transfers = {}
+        missing = []
+        for tx_hash in tx_hashes:
+            cached = self._cached_transfers(tx_hash)
+            if cached is None:
+                missing.append(tx_hash)
+            else:
+                transfers[tx_hash] = cached
+                
+        transfers.update(self._fetch_transfers(missing, max_in_flight))
+        return [transfers[tx_hash] for tx_hash in tx_hashes]
+        
+    def _fetch_transfers(self, tx_hashes, max_in_flight=1, executor=None):
+        """{tx_hash: transfers} for uncached transactions, receipt_batch_size per request
         
+        Batches run on executor when given, otherwise on a pool of
+        max_in_flight threads created for this call. Fetched receipts are
+        added to the receipt cache.
+        """
+        transfers = {}
+        chunks = [tx_hashes[i:i + self.receipt_batch_size] for i in range(0, len(tx_hashes), self.receipt_batch_size)]
+        if max_in_flight > 1 and len(chunks) > 1:
+            if executor is not None:
+                receipts = list(executor.map(self.fetch_receipts_batch, chunks))
+            else:
+                with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                    receipts = list(executor.map(self.fetch_receipts_batch, chunks))
+        else:
+            receipts = [self.fetch_receipts_batch(chunk) for chunk in chunks]
+            
+        for chunk, logs_by_hash in zip(chunks, receipts):
+            for tx_hash in chunk:
+                logs = logs_by_hash.get(tx_hash)
+                if logs is None:
+                    transfers[tx_hash] = []
+                    continue
+                transfers[tx_hash] = self.decode_all_transfer_events(logs)
+                if self.receipt_cache is not None:
+                    self.receipt_cache.put(tx_hash, logs)
+        return transfers
+        
+    def _rpc_post(self, payload, description, failed=None, valid=lambda reply: isinstance(reply, dict)):
+        """One rate-limited JSON-RPC POST to the best RPC endpoint; the parsed reply, or None on failure
+        
+        Rate limiting, timeouts, errors and replies that are not valid are
+        recorded against the endpoint once, and the endpoint is added to
+        failed (if given) so a retry can avoid it. Retrying is up to the
+        caller.
+        """
+        endpoint = self.endpoints.acquire('rpc', exclude=failed or ())
+        METRICS.increment('api_calls')
+        started = time.monotonic()
+        try:
+            response = self.session.post(endpoint.url, json=payload, timeout=self.receipt_timeout)
+            METRICS.observe('api_latency_seconds', time.monotonic() - started)
+            if response.status_code == 429:
+                METRICS.increment('api_rate_limited')
+                self.endpoints.record(endpoint, time.monotonic() - started, ok=False, congested=True)
+                logger.warning(f"🚦 Rate limited by {endpoint.name} fetching {description}, "
+                               f"slowing it to {endpoint.rate_limiter.rate:.2f} calls/sec")
+                reply = None
+            else:
+                reply = response.json()
+                if valid(reply):
+                    self.endpoints.record(endpoint, time.monotonic() - started)
+                    return reply
+                METRICS.increment('api_errors')
+                self.endpoints.record(endpoint, time.monotonic() - started, ok=False)
+                logger.warning(f"Invalid reply for {description} from {endpoint.name}: "
+                               f"{reply.get('error') if isinstance(reply, dict) else reply}")
+                reply = None
+        except requests.exceptions.Timeout:
+            METRICS.increment('api_timeouts')
+            self.endpoints.record(endpoint, time.monotonic() - started, ok=False, congested=True)
+            logger.warning(f"⏰ Timeout fetching {description} from {endpoint.name}")
+            reply = None
+        except Exception as e:
+            METRICS.increment('api_errors')
+            self.endpoints.record(endpoint, time.monotonic() - started, ok=False)
+            logger.warning(f"Error getting {description} from {endpoint.name}: {e}")
+            reply = None
+            
+        if failed is not None:
+            failed.add(endpoint)
+        return reply
+        
+    @METRICS.timed('fetch')
+    def fetch_receipts_batch(self, tx_hashes):
+        """Receipt logs for up to receipt_batch_size transactions in one JSON-RPC batch
+        
+        Returns {tx_hash: logs}; transactions without a receipt after the
+        retries are left out. Entries that fail inside an otherwise good
+        batch are retried on their own in the next attempt.
+        """
+        logs_by_hash = {}
+        pending = list(tx_hashes)
         max_retries = 3
+        failed = set()
+        
         for attempt in range(max_retries):
-            try:
-                # Add timeout to prevent SSL hangs
-                response = requests.get(self.base_url, params=params, timeout=(3, 10))
-                data = response.json()
+            if not pending:
+                break
+            if attempt:
+                METRICS.increment('api_retries')
                 
-                if data.get('result'):
-                    logs = data['result'].get('logs', [])
-                    transfers = self.decode_all_transfer_events(logs)
-                    return transfers
-                else:
-                    print(f"No receipt for {tx_hash}")
-                    return []
-                    
-            except requests.exceptions.Timeout:
-                print(f"⏰ Timeout on attempt {attempt + 1}/{max_retries} for {tx_hash}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)  # Short delay between retries
-                    continue
-                else:
-                    print(f"❌ All retry attempts failed for {tx_hash}, returning empty list")
-                    return []  # Return empty list instead of crashing
-            except Exception as e:
-                print(f"Error getting transaction receipt for {tx_hash} (attempt {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
+            payload = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_getTransactionReceipt', 'params': [tx_hash]}
+                       for i, tx_hash in enumerate(pending)]
+            METRICS.increment('rpc_batched_receipts', len(pending))
+            # A node rejecting the whole batch answers with a single error object
+            replies = self._rpc_post(payload, f"{len(pending)} receipts", failed,
+                                     valid=lambda replies: isinstance(replies, list))
+            if replies is None:
+                if not self.endpoints.can_avoid('rpc', failed):
                     time.sleep(1)
-                    continue
+                continue
+                
+            retry = []
+            replies_by_id = {reply.get('id'): reply for reply in replies if isinstance(reply, dict)}
+            for i, tx_hash in enumerate(pending):
+                reply = replies_by_id.get(i)
+                if reply is None or 'error' in reply:
+                    retry.append(tx_hash)
+                elif reply.get('result'):
+                    logs_by_hash[tx_hash] = reply['result'].get('logs', [])
                 else:
-                    print(f"❌ Final attempt failed for {tx_hash}, returning empty list")
-                    return []
+                    METRICS.increment('empty_receipts')
+                    logger.warning(f"No receipt for {tx_hash}")
+            pending = retry
+            
+        if pending:
+            METRICS.increment('api_failures', len(pending))
+            logger.error(f"❌ All retry attempts failed for {len(pending)} receipts")
+        return logs_by_hash
+        
+    @METRICS.timed('fetch')
+    def get_token_transfers_from_transaction(self, tx_hash):
+        """Get ALL token transfers from a specific transaction hash (RATE LIMITED)"""
+        cached = self._cached_transfers(tx_hash)
+        if cached is not None:
+            return cached
+                
+        params = {
+            'chainid': self.chain_id,
+            'module': 'proxy',
+            'action': 'eth_getTransactionReceipt',
+            'txhash': tx_hash
+        }
+        # CRITICAL: _api_request rate limits EVERY API call, retries included
+        data = self._api_request(params, f"receipt of {tx_hash}", timeout=self.receipt_timeout)
+        if data is None:
+            return []
             
+        receipt = data.get('result')
+        if not isinstance(receipt, dict):
+            if receipt:
+                METRICS.increment('api_errors')
+                logger.warning(f"Unexpected receipt reply for {tx_hash}: {receipt}")
+            else:
+                METRICS.increment('empty_receipts')
+                logger.warning(f"No receipt for {tx_hash}")
+            return []
+            
+        logs = receipt.get('logs', [])
+        if self.receipt_cache is not None:
+            self.receipt_cache.put(tx_hash, logs)
+        return self.decode_all_transfer_events(logs)
+            
+    def _cached_transfers(self, tx_hash):
+        """Transfers decoded from the cached receipt logs of tx_hash, or None if not cached
+        
+        Decoding on read goes through the current token registry, so a token
+        that was unknown when the receipt was cached is picked up once resolved.
+        """
+        if self.receipt_cache is None:
+            return None
+        logs = self.receipt_cache.get_logs(tx_hash)
+        return None if logs is None else self.decode_all_transfer_events(logs)
+        
+    @METRICS.timed('decode')
     def decode_all_transfer_events(self, logs):
         """Decode ALL ERC-20 Transfer events from transaction logs"""
-        # ERC-20 Transfer event signature: Transfer(address,address,uint256)
-        transfer_topic = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
-        
         transfers = []
-        for log in logs:
-            topics = log.get('topics', [])
-            
-            # Check if this is a Transfer event
-            if len(topics) > 0 and topics[0].lower() == transfer_topic.lower():
-                try:
-                    # Extract addresses from topics
-                    if len(topics) >= 3:
-                        # Remove leading zeros and add 0x prefix
-                        from_address = "0x" + topics[1][-40:].lower()
-                        to_address = "0x" + topics[2][-40:].lower()
-                        token_address = log.get('address', '').lower()
-                        
-                        # Decode amount from data field
-                        data = log.get('data', '0x')
-                        amount_wei = 0
-                        amount = 0
-                        
-                        if data and data != '0x':
-                            try:
-                                amount_hex = data[2:]  # Remove 0x prefix
-                                amount_wei = int(amount_hex, 16) if amount_hex else 0
-                            except:
-                                amount_wei = 0
-                        
-                        # Try to get token symbol and decimals (fallback to common values)
-                        symbol, decimals = self.get_token_info(token_address)
-                        
-                        if amount_wei > 0:
-                            amount = amount_wei / 10**decimals
-                        
-                        transfers.append({
-                            'from_address': from_address,
-                            'to_address': to_address,
-                            'token_address': token_address,
-                            'amount': amount,
-                            'amount_wei': amount_wei,
-                            'symbol': symbol,
-                            'decimals': decimals
-                        })
-                        
-                except Exception as e:
-                    # Skip malformed transfer events
-                    continue
-                    
+        for _, _, from_topic, to_topic, token, data in _transfer_rows((logs,)):
+            token_address = token.lower()
+            amount_wei = _amount_wei(data)
+            symbol, decimals = self.get_token_info(token_address)
+            transfers.append({
+                'from_address': "0x" + from_topic[-40:].lower(),
+                'to_address': "0x" + to_topic[-40:].lower(),
+                'token_address': token_address,
+                'amount': amount_wei / 10**decimals if amount_wei > 0 else 0,
+                'amount_wei': amount_wei,
+                'symbol': symbol,
+                'decimals': decimals
+            })
         return transfers
         
-    def get_token_info(self, token_address):
-        """Try to get token symbol and decimals, with fallbacks"""
-        # Common token mappings for Linea
-        known_tokens = {
-            "0x176211869ca2b568f2a7d4ee941e073a821ee1ff": ("USDC", 6),
-            "0xa219439258ca9da29e9cc4ce5596924745e12b93": ("USDT", 6),
-            "0x3ff47c5bf409c86533fe1f4907524d304062428d": ("EURe", 18),
-            "0xe5D7C2a44FfDDf6b295A15c148167daaAf5Cf34f": ("WETH", 18),
-        }
+    @METRICS.timed('decode')
+    def decode_transfer_batch(self, receipts, settlements=None):
+        """decode_transfer_columns plus symbol, decimals and amount columns
         
-        token_address = token_address.lower()
+        Token metadata is looked up once per distinct token in the batch.
+        """
+        columns = decode_transfer_columns(receipts, settlements)
+        tokens = columns['token_address']
+        token_info = {token: self.get_token_info(token) for token in set(tokens)}
         
-        if token_address in known_tokens:
-            return known_tokens[token_address]
-            
-        # Fallback to common defaults
-    def save_preliminary_data(self, transactions, processed_count, total_count):
-        """Save preliminary data every 50 transactions for early investigation"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"metamask_preliminary_{processed_count}of{total_count}_{timestamp}.csv"
+        scales = {token: 10**decimals for token, (_, decimals) in token_info.items()}
         
-        if transactions:
-            df = pd.DataFrame(transactions)
-            
-            # Add basic calculated columns
-            df['date'] = pd.to_datetime(df['timestamp']).dt.date
-            df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-            
-            # Save
-            df.to_csv(filename, index=False)
-            
-            print(f"\n💾 PRELIMINARY SAVE: {filename}")
-            print(f"📊 Progress: {processed_count}/{total_count} transactions processed")
-            print(f"💳 Found: {len(transactions)} card purchases so far")
+        columns['symbol'] = np.array([token_info[token][0] for token in tokens], dtype=object)
+        columns['decimals'] = np.fromiter((token_info[token][1] for token in tokens), dtype=np.int64,
+                                          count=len(tokens))
+        columns['amount'] = np.fromiter((amount_wei / scales[token] for amount_wei, token in zip(columns['amount_wei'], tokens)),
+                                        dtype=np.float64, count=len(tokens))
+        return columns
+        
+    def get_token_info(self, token_address):
+        """Token symbol and decimals from the registry (resolved on chain if unknown)"""
+        return self.token_registry.get(token_address)
+        
+    def save_preliminary_data(self, checkpoint, recent_records, processed_count, total_count):
+        """Flush the checkpoint every 50 transactions and preview what was found"""
+        checkpoint.flush()
+        
+        if checkpoint.records_written:
+            logger.info(f"\n💾 CHECKPOINT SAVE: {checkpoint.log_path}")
+            logger.info(f"📊 Progress: {processed_count}/{total_count} transactions processed")
+            logger.info(f"💳 Found: {checkpoint.records_written} card purchases so far")
             
-            if len(transactions) > 0:
-                # Quick analysis
-                print(f"🎯 QUICK PREVIEW:")
-                print(f"  Unique users: {df['user_wallet'].nunique()}")
-                print(f"  Tokens used: {df['token_symbol'].value_counts().to_dict()}")
-                print(f"  Settlement addresses: {df['settlement_address'].unique().tolist()}")
-                print(f"  Amount range: ${df['amount'].min():.2f} - ${df['amount'].max():.2f}")
-                print(f"  Latest purchase: {df['timestamp'].max()}")
+            if recent_records:
+                df = pd.DataFrame(recent_records)
+                
+                # Quick analysis of the latest batch only, so memory stays bounded
+                logger.info(f"🎯 QUICK PREVIEW (last {len(recent_records)} purchases):")
+                logger.info(f"  Unique users: {df['user_wallet'].nunique()}")
+                logger.info(f"  Tokens used: {df['token_symbol'].value_counts().to_dict()}")
+                logger.info(f"  Settlement addresses: {df['settlement_address'].unique().tolist()}")
+                logger.info(f"  Amount range: ${df['amount'].min():.2f} - ${df['amount'].max():.2f}")
+                logger.info(f"  Latest purchase: {df['timestamp'].max()}")
                 
                 # Show a few examples
-                print(f"\n📝 SAMPLE PURCHASES:")
+                logger.info(f"\n📝 SAMPLE PURCHASES:")
                 sample = df.head(3)[['timestamp', 'user_wallet', 'amount', 'token_symbol']]
                 for _, row in sample.iterrows():
-                    print(f"  {row['amount']:.2f} {row['token_symbol']} - {row['user_wallet'][:10]}... - {row['timestamp'][:10]}")
-            else:
-                print(f"⚠️ No card purchases found in first {processed_count} transactions")
-                print("📋 POSSIBLE REASONS:")
-                print("  - Contract not used for card transactions")
-                print("  - Wrong settlement address")
-                print("  - No recent card activity")
-                print("  - Wrong contract address")
+                    logger.info(f"  {row['amount']:.2f} {row['token_symbol']} - {row['user_wallet'][:10]}... - {row['timestamp'][:10]}")
+                    
+            return checkpoint.log_path
+            
+        # Save debug info while nothing has been found
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"metamask_preliminary_{processed_count}of{total_count}_{timestamp}_debug.txt"
+        debug_info = {
+            'processed_transactions': processed_count,
+            'total_transactions': total_count,
+            'settlements_tracked': len(self.known_settlements) + len(self.discovered_settlements),
+            'message': 'No card purchases found yet'
+        }
+        
+        with open(filename, 'w') as f:
+            for key, value in debug_info.items():
+                f.write(f"{key}: {value}\n")
                 
-        else:
-            # Save empty file with debug info
-            debug_info = {
-                'processed_transactions': processed_count,
-                'total_transactions': total_count,
-                'settlements_tracked': len(self.known_settlements) + len(self.discovered_settlements),
-                'message': 'No card purchases found yet'
-            }
+        logger.info(f"\n💾 DEBUG SAVE: {filename}")
+        logger.warning(f"⚠️ No card data found in {processed_count} transactions")
+        logger.info("📋 POSSIBLE REASONS:")
+        logger.info("  - Contract not used for card transactions")
+        logger.info("  - Wrong settlement address")
+        logger.info("  - No recent card activity")
+        logger.info("  - Wrong contract address")
+        
+        return filename
+        
+    def save_complete_spending_data(self, records, previous_file=None):
+        """Save new records merged with the previous complete spending file; the file saved, or None if empty
+        
+        New records come from blocks after the previous file's, so they go
+        first (newest first, like the listing); records of transactions
+        already in the previous file are dropped.
+        """
+        if previous_file is None:
+            if len(records) == 0:
+                logger.error("❌ No card purchases found")
+                return None
+            filename = self.save_spending_data(records)
+            logger.info(f"💾 Data saved to {filename}")
+            return filename
             
-            with open(filename.replace('.csv', '_debug.txt'), 'w') as f:
-                for key, value in debug_info.items():
-                    f.write(f"{key}: {value}\n")
+        if len(records) == 0:
+            logger.info(f"💾 No new purchases, {previous_file} is still complete")
+            return previous_file
             
-            print(f"\n💾 DEBUG SAVE: {filename.replace('.csv', '_debug.txt')}")
-            print(f"⚠️ No card data found in {processed_count} transactions")
+        previous = load_spending_file(previous_file)
+        records = records[~records['transaction_hash'].isin(set(previous['transaction_hash']))]
+        filename = self.save_spending_data(pd.concat([records[SPENDING_COLUMNS], previous], ignore_index=True))
+        logger.info(f"💾 {len(records):,} new purchases merged with {len(previous):,} from {previous_file} into {filename}")
+        return filename
+        
+    @METRICS.timed('save')
+    def save_spending_data(self, transactions):
+        """Save all card spending data in the collector's output format"""
+        if self.output_format == 'parquet':
+            return self.save_to_parquet(transactions)
+        return self.save_to_csv(transactions)
+        
+    def save_to_parquet(self, transactions):
+        """Save all card spending data as typed, dictionary-encoded Parquet"""
+        import pyarrow.parquet as pq
+        
+        df = pd.DataFrame(transactions)
+        table = spending_arrow_table(df)
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"metamask_card_complete_spending_{timestamp}.parquet"
+        pq.write_table(table, filename, compression='zstd')
+        
+        self.print_complete_analysis(table.to_pandas())
         
         return filename
         
@@ -445,18 +1869,18 @@ class MetamaskCardTransactionCollector:
         
     def print_complete_analysis(self, df):
         """Print comprehensive spending analysis"""
-        print(f"\n{'='*60}")
-        print(f"🎯 COMPLETE METAMASK CARD SPENDING ANALYSIS")
-        print(f"{'='*60}")
+        logger.info(f"\n{'='*60}")
+        logger.info(f"🎯 COMPLETE METAMASK CARD SPENDING ANALYSIS")
+        logger.info(f"{'='*60}")
         
-        print(f"📊 OVERVIEW:")
-        print(f"  Total card purchases: {len(df):,}")
-        print(f"  Unique card users: {df['user_wallet'].nunique():,}")
-        print(f"  Unique tokens used: {df['token_symbol'].nunique()}")
-        print(f"  Date range: {df['date'].min()} to {df['date'].max()}")
+        logger.info(f"📊 OVERVIEW:")
+        logger.info(f"  Total card purchases: {len(df):,}")
+        logger.info(f"  Unique card users: {df['user_wallet'].nunique():,}")
+        logger.info(f"  Unique tokens used: {df['token_symbol'].nunique()}")
+        logger.info(f"  Date range: {df['date'].min()} to {df['date'].max()}")
         
         # Token usage
-        print(f"\n💰 SPENDING BY TOKEN:")
+        logger.info(f"\n💰 SPENDING BY TOKEN:")
         token_stats = df.groupby('token_symbol').agg({
             'amount': ['sum', 'count', 'mean'],
             'user_wallet': 'nunique'
@@ -467,16 +1891,16 @@ class MetamaskCardTransactionCollector:
             count = token_stats.loc[token, ('amount', 'count')]
             avg = token_stats.loc[token, ('amount', 'mean')]
             users = token_stats.loc[token, ('user_wallet', 'nunique')]
-            print(f"  {token}: {total:,.2f} total | {count:,} purchases | {avg:.2f} avg | {users:,} users")
+            logger.info(f"  {token}: {total:,.2f} total | {count:,} purchases | {avg:.2f} avg | {users:,} users")
             
         # Top purchases
-        print(f"\n🏆 LARGEST CARD PURCHASES:")
+        logger.info(f"\n🏆 LARGEST CARD PURCHASES:")
         top_purchases = df.nlargest(10, 'amount')[['timestamp', 'user_wallet', 'amount', 'token_symbol']]
         for _, row in top_purchases.iterrows():
-            print(f"  {row['amount']:.2f} {row['token_symbol']} - {row['user_wallet'][:10]}... - {row['timestamp'][:10]}")
+            logger.info(f"  {row['amount']:.2f} {row['token_symbol']} - {row['user_wallet'][:10]}... - {str(row['timestamp'])[:10]}")
             
         # Most active users
-        print(f"\n👥 MOST ACTIVE CARD USERS:")
+        logger.info(f"\n👥 MOST ACTIVE CARD USERS:")
         user_stats = df.groupby('user_wallet').agg({
             'amount': ['count', 'sum'],
             'token_symbol': lambda x: ', '.join(x.unique())
@@ -485,83 +1909,123 @@ class MetamaskCardTransactionCollector:
         top_users = user_stats.nlargest(10, 'purchase_count')
         
         for user, stats in top_users.iterrows():
-            print(f"  {user[:10]}... - {stats['purchase_count']} purchases - {stats['total_spent']:.2f} spent - {stats['tokens_used']}")
+            logger.info(f"  {user[:10]}... - {stats['purchase_count']} purchases - {stats['total_spent']:.2f} spent - {stats['tokens_used']}")
             
         # Time patterns
-        print(f"\n⏰ USAGE PATTERNS:")
+        logger.info(f"\n⏰ USAGE PATTERNS:")
         hourly = df.groupby('hour').size()
         peak_hour = hourly.idxmax()
-        print(f"  Peak hour: {peak_hour}:00 ({hourly[peak_hour]} purchases)")
+        logger.info(f"  Peak hour: {peak_hour}:00 ({hourly[peak_hour]} purchases)")
         
         daily = df.groupby('day_of_week').size()
         peak_day = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][daily.idxmax()]
-        print(f"  Peak day: {peak_day} ({daily.max()} purchases)")
+        logger.info(f"  Peak day: {peak_day} ({daily.max()} purchases)")
         
         weekend_pct = (df['is_weekend'].sum() / len(df)) * 100
-        print(f"  Weekend usage: {weekend_pct:.1f}% of purchases")
+        logger.info(f"  Weekend usage: {weekend_pct:.1f}% of purchases")
         
-        # API usage summary
-        elapsed_time = (time.time() - self.start_time) / 60 if hasattr(self, 'start_time') else 0
-        actual_rate = self.rate_limiter.call_count / elapsed_time / 60 if elapsed_time > 0 else 0
+        # API usage summary from the shared instrumentation
+        metrics = METRICS.snapshot()
+        api_calls = metrics['counters'].get('api_calls', 0)
+        elapsed_time = metrics['elapsed_seconds']
+        latency = metrics['histograms'].get('api_latency_seconds')
         
-        print(f"\n📊 API USAGE SUMMARY:")
-        print(f"  Total API calls made: {self.rate_limiter.call_count:,}")
-        print(f"  Execution time: {elapsed_time:.1f} minutes")
-        print(f"  Actual rate: {actual_rate:.2f} calls/sec")
-        print(f"  Rate limit: {self.rate_limiter.max_calls_per_second} calls/sec (safely under 5/sec)")
+        logger.info(f"\n📊 API USAGE SUMMARY:")
+        logger.info(f"  Total API calls made: {api_calls:,} "
+                    f"({metrics['counters'].get('api_retries', 0):,} retries, "
+                    f"{metrics['counters'].get('api_timeouts', 0):,} timeouts, "
+                    f"{metrics['counters'].get('empty_receipts', 0):,} empty receipts)")
+        logger.info(f"  Execution time: {elapsed_time / 60:.1f} minutes")
+        logger.info(f"  Actual rate: {api_calls / elapsed_time if elapsed_time > 0 else 0:.2f} calls/sec")
+        if latency and latency['count']:
+            logger.info(f"  Mean API latency: {latency['sum'] / latency['count'] * 1000:.0f} ms")
+        for stage, timing in metrics['stages'].items():
+            logger.info(f"  Stage {stage}: {timing['seconds']:.1f}s over {timing['calls']:,} calls")
+        if metrics['counters'].get('block_receipt_calls'):
+            logger.info(f"  Block receipts: {metrics['counters']['block_receipt_calls']:,} eth_getBlockReceipts calls, "
+                        f"{metrics['counters'].get('api_calls_saved', 0):,} API calls saved")
+        for endpoint in self.endpoints.stats():
+            logger.info(f"  {endpoint['kind'].upper()} {endpoint['name']}: {endpoint['call_count']:,} calls, "
+                        f"limit {endpoint['max_calls_per_second']} calls/sec, adaptive rate at finish "
+                        f"{endpoint['rate']:.2f} calls/sec ({endpoint['backoff_count']} backoffs), "
+                        f"{endpoint['total_sleep_time']:.1f}s waiting on the limiter, "
+                        f"{endpoint['failures']} failures, {endpoint['ejections']} ejections")
+        if self.receipt_cache is not None:
+            cache_stats = self.receipt_cache.stats()
+            logger.info(f"  Receipt cache: {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+                  f"({cache_stats['hit_rate']*100:.1f}% hit rate, {cache_stats['entries']:,} cached)")
         
         all_settlements = df['settlement_address'].unique()
-        print(f"\n✅ SETTLEMENT VERIFICATION:")
-        print(f"  Unique settlement addresses found: {len(all_settlements)}")
+        logger.info(f"\n✅ SETTLEMENT VERIFICATION:")
+        logger.info(f"  Unique settlement addresses found: {len(all_settlements)}")
         for addr in all_settlements:
             count = (df['settlement_address'] == addr).sum()
-            print(f"    {addr} - {count:,} transactions ({count/len(df)*100:.1f}%)")
+            logger.info(f"    {addr} - {count:,} transactions ({count/len(df)*100:.1f}%)")
 
 # Main usage
 if __name__ == "__main__":
-    print("🚀 FIXED Rate Limited MetaMask Card Analyzer")
-    print("Properly rate limited to never exceed 4 calls/sec")
-    print("=" * 60)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
+    logger.info("🚀 FIXED Rate Limited MetaMask Card Analyzer")
+    logger.info("Properly rate limited to never exceed 4 calls/sec")
+    logger.info("=" * 60)
     
     API_KEY = ""
     if not API_KEY:
         API_KEY = "YourAPIKey"
-        print("⚠️ Using default API key")
+        logger.warning("⚠️ Using default API key")
     
     # Option to disable auto-discovery for faster execution
     auto_discover = input("Auto-discover settlement addresses? (y/n, default=n): ").strip().lower()
     auto_discover = auto_discover == 'y'
     
-    collector = MetamaskCardTransactionCollector(API_KEY, auto_discover_settlements=auto_discover)
+    # Bulk Transfer-log scan needs far fewer calls than one receipt per transaction
+    use_logs = input("Scan Transfer logs in bulk instead of per-transaction receipts? (y/n, default=y): ").strip().lower()
+    use_logs = use_logs != 'n'
+    
+    # Extra explorer keys (ETHERSCAN_API_KEYS) and JSON-RPC nodes (LINEA_RPC_URLS, comma separated)
+    # each add their own rate budget; RPC nodes serve receipts in batches or per block
+    api_keys = [API_KEY] + [key for key in os.environ.get("ETHERSCAN_API_KEYS", "").split(",") if key and key != API_KEY]
+    rpc_urls = [url for url in os.environ.get("LINEA_RPC_URLS", os.environ.get("LINEA_RPC_URL", "")).split(",") if url]
+    endpoints = ([Endpoint(ETHERSCAN_API_URL, key, 'explorer', max_calls_per_second=3) for key in api_keys]
+                 + [Endpoint(url, kind='rpc', max_calls_per_second=10) for url in rpc_urls])
+    collector = MetamaskCardTransactionCollector(API_KEY, auto_discover_settlements=auto_discover,
+                                                 receipts_by_block=True, endpoints=endpoints)
     
     try:
         collector.start_time = time.time()
-        print(f"\n🎯 Analyzing contract: {collector.metamask_contract}")
-        print(f"🔗 Chain ID: {collector.chain_id} (Linea)")
+        logger.info(f"\n🎯 Analyzing contract: {collector.metamask_contract}")
+        logger.info(f"🔗 Chain ID: {collector.chain_id} (Linea)")
         if auto_discover:
-            print("🕵️ Will auto-discover settlement addresses")
+            logger.info("🕵️ Will auto-discover settlement addresses")
         else:
-            print(f"🎯 Using known settlements: {collector.known_settlements}")
-        print("⏳ This will discover ALL MetaMask card transactions...")
-        print(f"🛡️ GUARANTEED rate limited to {collector.rate_limiter.max_calls_per_second} calls/sec")
+            logger.info(f"🎯 Using known settlements: {collector.known_settlements}")
+        logger.info("⏳ This will discover ALL MetaMask card transactions...")
+        logger.info(f"🛡️ GUARANTEED rate limited to {collector.endpoints.budget('explorer')} calls/sec "
+                    f"over {len(collector.endpoints.endpoints)} endpoints")
         
-        filename = collector.collect_all_card_transactions()
+        if use_logs:
+            filename = collector.collect_card_transactions_from_logs()
+        else:
+            filename = collector.collect_all_card_transactions(max_in_flight=8)
         
         total_time = (time.time() - collector.start_time) / 60
-        print(f"\n⏱️ Total execution time: {total_time:.1f} minutes")
+        logger.info(f"\n⏱️ Total execution time: {total_time:.1f} minutes")
         
         if filename:
-            print(f"\n✅ SUCCESS! Complete spending analysis saved to: {filename}")
-            print("\n📈 This CSV contains COMPLETE MetaMask card data:")
-            print("- ALL tokens used (discovered automatically)")
-            print("- ALL settlement addresses (discovered automatically)")
-            print("- ALL user spending patterns")
-            print("- Complete transaction details")
-            print("- Time-based usage analysis")
+            logger.info(f"\n✅ SUCCESS! Complete spending analysis saved to: {filename}")
+            logger.info("\n📈 This CSV contains COMPLETE MetaMask card data:")
+            logger.info("- ALL tokens used (discovered automatically)")
+            logger.info("- ALL settlement addresses (discovered automatically)")
+            logger.info("- ALL user spending patterns")
+            logger.info("- Complete transaction details")
+            logger.info("- Time-based usage analysis")
         else:
-            print("\n❌ No card transactions found")
+            logger.error("\n❌ No card transactions found")
             
     except Exception as e:
-        print(f"\n❌ ERROR: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+        logger.exception(f"\n❌ ERROR: {e}")
+        
+    finally:
+        logger.info(f"📈 Metrics written to {METRICS.write_prometheus('metamask_collector_metrics.prom')} "
+                    f"and {METRICS.write_json('metamask_collector_metrics.json')}")
@@ -0,0 +1,140 @@
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from main import SPENDING_COLUMNS, TRANSFER_TOPIC, spending_arrow_table
+
+APPROVAL_TOPIC = "0x8c5be1e5ebec7d5bd14f71427d1e84f3dd0314c0f7b2291e5b200ac8c7c3b925"
+SETTLEMENT_ADDRESS = "0xf344192b9146132fc0e997d1666dc1531bf8f7cd"
+
+# (address, symbol, decimals, share of purchases, median amount, lognormal sigma),
+# calibrated on the collected Linea card spending
+SYNTHETIC_TOKENS = [
+    ("0x176211869ca2b568f2a7d4ee941e073a821ee1ff", "USDC", 6, 0.85, 13.0, 1.7),
+    ("0xa219439258ca9da29e9cc4ce5596924745e12b93", "USDT", 6, 0.11, 15.0, 1.5),
+    ("0x3ff47c5bf409c86533fe1f4907524d304062428d", "EURe", 18, 0.04, 8.5, 1.6),
+]
+
+def _hex_ids(rng, count, n_bytes):
+    """count random 0x-prefixed hex strings of n_bytes bytes"""
+    digits = rng.integers(0, 256, size=(count, n_bytes), dtype=np.uint8).tobytes().hex()
+    width = 2 * n_bytes
+    return np.array(["0x" + digits[i:i + width] for i in range(0, len(digits), width)], dtype=object)
+
+def generate_spending_data(n_transactions, n_wallets=None, days=120, seed=0,
+                           end=datetime(2025, 7, 2), end_block=20_497_629):
+    """Seeded synthetic card spending in the collector's CSV schema
+
+    Transactions per wallet are Pareto distributed (most wallets buy once
+    or twice, a few hundred times), each wallet is active over its own
+    stretch of a days-long window ending at end, and amounts are lognormal
+    per token. Rows are newest first, like the collector's output.
+    """
+    rng = np.random.default_rng(seed)
+    n_wallets = min(n_wallets or max(n_transactions // 6, 1), n_transactions)
+
+    # Heavy-tailed activity: every wallet buys at least once
+    activity = rng.pareto(1.3, n_wallets) + 1
+    counts = 1 + rng.multinomial(n_transactions - n_wallets, activity / activity.sum())
+    wallet_ids = np.repeat(np.arange(n_wallets), counts)
+
+    # Each wallet is active from a random start for an exponential lifetime
+    window = days * 86400
+    first_seen = rng.uniform(0, window, n_wallets)
+    lifetime = np.minimum(rng.exponential(window / 3, n_wallets), window - first_seen)
+    offsets = first_seen[wallet_ids] + rng.random(n_transactions) * lifetime[wallet_ids]
+    seconds_before_end = (window - offsets).astype(np.int64)
+
+    # A preferred token per wallet, with occasional purchases in another one
+    shares = np.array([token[3] for token in SYNTHETIC_TOKENS])
+    preferred = rng.choice(len(SYNTHETIC_TOKENS), size=n_wallets, p=shares)
+    token_ids = np.where(rng.random(n_transactions) < 0.9, preferred[wallet_ids],
+                         rng.choice(len(SYNTHETIC_TOKENS), size=n_transactions, p=shares))
+
+    # Amounts in micro units so the float amount and the integer wei agree exactly
+    medians = np.array([token[4] for token in SYNTHETIC_TOKENS])
+    sigmas = np.array([token[5] for token in SYNTHETIC_TOKENS])
+    amounts = rng.lognormal(np.log(medians[token_ids]), sigmas[token_ids])
+    micro_units = np.maximum(np.rint(amounts * 1e6), 1).astype(np.int64)
+    decimals = np.array([token[2] for token in SYNTHETIC_TOKENS])
+    amount_wei = np.char.add(micro_units.astype(str),
+                             np.array(['0' * (d - 6) for d in decimals])[token_ids]).astype(object)
+
+    order = np.argsort(seconds_before_end, kind='stable')
+    wallets = _hex_ids(rng, n_wallets, 20)
+    timestamps = pd.Timestamp(end) - pd.to_timedelta(seconds_before_end[order], unit='s')
+
+    df = pd.DataFrame({
+        'transaction_hash': _hex_ids(rng, n_transactions, 32),
+        'timestamp': np.datetime_as_string(timestamps.to_numpy(), unit='s').astype(object),
+        'block_number': end_block - seconds_before_end[order] // 2,
+        'user_wallet': wallets[wallet_ids[order]],
+        'settlement_address': SETTLEMENT_ADDRESS,
+        'amount': micro_units[order] / 1e6,
+        'amount_wei': amount_wei[order],
+        'token_address': np.array([token[0] for token in SYNTHETIC_TOKENS], dtype=object)[token_ids[order]],
+        'token_symbol': np.array([token[1] for token in SYNTHETIC_TOKENS], dtype=object)[token_ids[order]],
+        'transaction_type': 'card_purchase',
+        'gas_used': np.where(rng.random(n_transactions) < 0.97, 68394, rng.integers(58_000, 400_000, n_transactions)),
+        'gas_price': 50_742_976
+    }, columns=SPENDING_COLUMNS)
+
+    # Same calculated columns as the collector's CSV
+    df['date'] = timestamps.date
+    df['hour'] = timestamps.hour
+    df['day_of_week'] = timestamps.dayofweek
+    df['is_weekend'] = df['day_of_week'].isin([5, 6])
+    return df
+
+def generate_receipt_logs(spending, approvals_per_receipt=1, seed=0):
+    """Receipt logs for synthetic spending, as {tx_hash: [log, ...]}
+
+    Each receipt carries the card's ERC-20 Transfer to the settlement
+    address plus approvals_per_receipt Approval events that
+    decode_all_transfer_events has to skip.
+    """
+    rng = np.random.default_rng(seed)
+    pad = "0x" + "0" * 24
+    receipts = {}
+
+    for tx_hash, wallet, token, wei in zip(spending['transaction_hash'], spending['user_wallet'],
+                                           spending['token_address'], spending['amount_wei']):
+        logs = [{
+            'address': token,
+            'topics': [TRANSFER_TOPIC, pad + wallet[2:], pad + SETTLEMENT_ADDRESS[2:]],
+            'data': "0x" + format(int(wei), '064x')
+        }]
+        for _ in range(approvals_per_receipt):
+            logs.append({
+                'address': token,
+                'topics': [APPROVAL_TOPIC, pad + wallet[2:], pad + "%040x" % rng.integers(1 << 62)],
+                'data': "0x" + "f" * 64
+            })
+        receipts[tx_hash] = logs
+
+    return receipts
+
+def save_synthetic_spending(df, filename):
+    """Write synthetic spending as CSV, or as the collector's typed Parquet for .parquet"""
+    if filename.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        pq.write_table(spending_arrow_table(df), filename, compression='zstd')
+    else:
+        df.to_csv(filename, index=False)
+    return filename
+
+if __name__ == "__main__":
+    n_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    print(f"🧪 Generating {n_transactions:,} synthetic card purchases (seed {seed})...")
+    spending = generate_spending_data(n_transactions, seed=seed)
+    filename = save_synthetic_spending(spending, f"synthetic_spending_{n_transactions}_seed{seed}.csv")
+
+    per_wallet = spending['user_wallet'].value_counts()
+    print(f"📄 Saved to: {filename}")
+    print(f"👥 {len(per_wallet):,} wallets - median {per_wallet.median():.0f}, max {per_wallet.max():,} purchases per wallet")
+    print(f"💰 Tokens: {spending['token_symbol'].value_counts().to_dict()}")
+    print(f"📅 {spending['date'].min()} to {spending['date'].max()}")